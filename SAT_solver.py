@@ -1,165 +1,188 @@
-import sys
+import argparse
 import numpy as np
+from array import array
 from time import time
+from cnf import ClauseArena, to_number
+from dimacs import DimacsParser, read_dimacs
+from preprocess import Preprocessor
+from stats import ProfileHook, Stats
+from verify import verify
 
 
 class Formula:
+    # State of the DPLL search: assignments are kept on a trail, every literal knows the clauses it occurs in,
+    # so assigning and unassigning a literal only visits those clauses. The number of unassigned literals and
+    # the variable that satisfied every clause are updated on the way, as well as the number of occurrences of
+    # every literal among unassigned literals of unsatisfied clauses (used for pure literals and branching).
     def __init__(self, variables: int, clauses: int):
         self.num_of_vars = variables
         self.num_of_clauses = clauses
-        self.clauses = []
-        self.negated = [0]*(variables+1)
-        self.non_negated = [0]*(variables+1)
+        self.arena = ClauseArena(variables)
+        self.literals = []  # literals of every clause as tuples, faster to iterate than the arena
+        self.occurs = [[] for _ in range(2*(variables+1))]  # clauses of every literal
+        self.free = array('i')  # number of unassigned literals of every clause
+        self.solved_by = array('i')  # variable that satisfied the clause, 0 if none
+        self.unsatisfied = 0  # number of clauses that are not satisfied yet
+        # value of every literal: 1 (true), -1 (false) or 0 (unassigned)
+        self.values = array('b', [0])*(2*(variables+1))
+        # occurrences of every literal among unassigned literals of unsatisfied clauses
+        self.occurrences = array('i', [0])*(2*(variables+1))
+        self.counts = None  # numpy view of occurrences, made at the first decision
+        self.trail = array('i')  # assigned literals in the order of assignment
+        self.trail_lim = []  # trail position of every decision
+        self.flipped = []  # whether the decision was already tried with both values
+        self.units = []  # clauses that had one unassigned literal left when they were last visited
+        self.pure = list(range(variables, 0, -1))  # variables that may be pure, checked when popped
+        self.conflict = False
 
     def __str__(self):
         ret = ""
-        for c in self.clauses:
-            ret += str(c)
-            ret += " | "
+        for c in range(len(self.arena)):
+            if self.solved_by[c] == 0:
+                ret += " ".join(str(to_number(l)) for l in self.arena[c])
+                ret += " | "
         return ret[:-3]
 
-    def add_clause(self, clause_str: str):
-        self.clauses.append(Clause(self, clause_str))
-
-    def simplify(self, number: int, value: bool):
-        # returns simplified formula and list of clauses that are removed/satisfied
-        sat_clauses = []
-        unsat_clauses = []
-        for c in self.clauses:
-            if c.does_it_solve(self, number, value):
-                sat_clauses.append(c)
-            else:
-                unsat_clauses.append(c)
-        self.clauses = unsat_clauses
-        return self, sat_clauses
-
-    def undo(self, number):
-        for c in self.clauses:
-            c.undo_clause(self, number)
-
-    def find_unit_clause(self):
-        for c in self.clauses:
-            if len(c) == 1:
-                return c.unused_literals[0].number, not c.unused_literals[0].is_negated
-        return None, None
-
-    def contains_empty(self):
-        for c in self.clauses:
-            if len(c) == 0:
+    def add_clause(self, literals):
+        c = self.arena.add_clause(literals)
+        self.literals.append(tuple(literals))
+        self.free.append(len(literals))
+        self.solved_by.append(0)
+        self.unsatisfied += 1
+        for l in literals:
+            self.occurs[l].append(c)
+            self.occurrences[l] += 1
+        if len(literals) == 0:
+            self.conflict = True
+        elif len(literals) == 1:
+            self.units.append(c)
+
+    def assign(self, literal: int):
+        # makes the literal true, sets conflict if a clause has no unassigned literals left
+        values, occurrences, free, solved_by = self.values, self.occurrences, self.free, self.solved_by
+        literals, pure = self.literals, self.pure
+        var = literal >> 1
+        values[literal] = 1
+        for c in self.occurs[literal]:
+            free[c] -= 1
+            if solved_by[c] == 0:
+                solved_by[c] = var
+                self.unsatisfied -= 1
+                for l in literals[c]:
+                    if values[l] != -1:
+                        occurrences[l] -= 1
+                        if occurrences[l] == 0:
+                            pure.append(l >> 1)
+        false_lit = literal ^ 1
+        values[false_lit] = -1
+        for c in self.occurs[false_lit]:
+            free[c] -= 1
+            if solved_by[c] == 0:
+                occurrences[false_lit] -= 1
+                if free[c] == 0:
+                    self.conflict = True
+                elif free[c] == 1:
+                    self.units.append(c)
+        self.trail.append(literal)
+
+    def unassign(self):
+        # undoes the last assignment on the trail
+        values, occurrences, free, solved_by = self.values, self.occurrences, self.free, self.solved_by
+        literals, pure = self.literals, self.pure
+        literal = self.trail.pop()
+        var = literal >> 1
+        false_lit = literal ^ 1
+        for c in self.occurs[false_lit]:
+            free[c] += 1
+            if solved_by[c] == 0:
+                occurrences[false_lit] += 1
+        values[false_lit] = 0
+        for c in self.occurs[literal]:
+            free[c] += 1
+            if solved_by[c] == var:
+                solved_by[c] = 0
+                self.unsatisfied += 1
+                for l in literals[c]:
+                    if values[l] != -1:
+                        if occurrences[l] == 0:
+                            pure.append(l >> 1)
+                        occurrences[l] += 1
+        values[literal] = 0
+        pure.append(var)
+
+    def decide(self, literal: int):
+        self.trail_lim.append(len(self.trail))
+        self.flipped.append(False)
+        self.assign(literal)
+
+    def backtrack(self):
+        # undoes the assignments up to the last decision that was not flipped yet and assigns the other value,
+        # returns False if there is no such decision
+        self.conflict = False
+        self.units.clear()
+        while len(self.trail_lim) > 0:
+            position = self.trail_lim[-1]
+            literal = self.trail[position]
+            while len(self.trail) > position:
+                self.unassign()
+            if not self.flipped[-1]:
+                self.flipped[-1] = True
+                self.assign(literal ^ 1)
                 return True
+            self.trail_lim.pop()
+            self.flipped.pop()
         return False
 
+    def find_unit(self):
+        # the unassigned literal of an unsatisfied clause with one unassigned literal, or None
+        values, units = self.values, self.units
+        while len(units) > 0:
+            c = units.pop()
+            if self.solved_by[c] == 0 and self.free[c] == 1:
+                for l in self.arena[c]:
+                    if values[l] == 0:
+                        return l
+        return None
+
     def find_pure(self):
-        for i,(n1,n2) in enumerate(zip(self.negated,self.non_negated)):
+        # an unassigned literal whose negation does not occur in the unsatisfied clauses, or None
+        values, occurrences, pure = self.values, self.occurrences, self.pure
+        while len(pure) > 0:
+            var = pure.pop()
+            if values[2*var] != 0:
+                continue
+            n1, n2 = occurrences[2*var+1], occurrences[2*var]
             if n1 == 0 and n2 > 0:
-                return i, True
+                return 2*var
             elif n2 == 0 and n1 > 0:
-                return i, False
-        return None, None
+                return 2*var+1
+        return None
 
     def get_literal(self):
-        #return self.clauses[0].unused_literals[0].number, not self.clauses[0].unused_literals[0].is_negated
-        lit1 = np.argmax(self.negated)
-        lit2 = np.argmax(self.non_negated)
-        if self.negated[lit1] > self.non_negated[lit2]:
-            return lit1, False
-        else:
-            return lit2, True
-
-
-class Clause:
-    def __init__(self, f: Formula, clause_str):
-        self.unused_literals = []
-        self.used_literals = []
-        self.is_solved = False
-        if clause_str is not None:
-            literals = clause_str.split()
-            for l in literals[:-1]:
-                self.unused_literals.append(Literal(f, l))
-
-    def __str__(self):
-        return " ".join([str(l) for l in self.unused_literals])
-
-    def __len__(self):
-        return len(self.unused_literals)
-
-    def does_it_solve(self, f: Formula, number: int, value: bool):
-        literals = list(filter(lambda l: l.number == number, self.unused_literals))
-        if len(literals) > 0:
-            for l in literals:
-                if l.eval(value):
-                    self.is_solved = True
-            if self.is_solved:
-                for l in self.unused_literals:
-                    if l.is_negated:
-                        f.negated[l.number] -= 1
-                    else:
-                        f.non_negated[l.number] -= 1
-            else:
-                for l in literals:
-                    self.unused_literals.remove(l)
-                    self.used_literals.append(l)
-                    if l.is_negated:
-                        f.negated[l.number] -= 1
-                    else:
-                        f.non_negated[l.number] -= 1
-        return self.is_solved
-
-    def undo_clause(self, f: Formula, number: int):
-        # literals = filter(lambda l: l.number == number, self.used_literals)
-        if self.is_solved:
-            self.is_solved = False
-            for l in self.unused_literals:
-                if l.is_negated:
-                    f.negated[l.number]+=1
-                else:
-                    f.non_negated[l.number]+=1
+        # the literal with the most occurrences
+        if self.counts is None:
+            self.counts = np.frombuffer(self.occurrences, dtype=np.int32)
+        counts = self.counts
+        lit1 = np.argmax(counts[1::2])
+        lit2 = np.argmax(counts[0::2])
+        if counts[2*lit1+1] > counts[2*lit2]:
+            return 2*int(lit1)+1
         else:
-            for l in self.used_literals:
-                if l.number == number:
-                    self.unused_literals.append(l)
-                    self.used_literals.remove(l)
-                    if l.is_negated:
-                        f.negated[number] += 1
-                    else:
-                        f.non_negated[number] += 1
+            return 2*int(lit2)
 
+    def model(self):
+        return [(l >> 1, not l & 1) for l in self.trail]
 
-class Literal:
-    def __init__(self, f: Formula, literal_str):
-        self.is_negated = False
-        self.number = 0
-        if literal_str is not None:
-            if literal_str[0] == '-':
-                self.is_negated = True
-                literal_str = literal_str[1:]
-                f.negated[int(literal_str)] += 1
-            else:
-                f.non_negated[int(literal_str)] += 1
-            self.number = int(literal_str)
-
-    def __str__(self):
-        if self.is_negated:
-            return "-" + str(self.number)
-        return str(self.number)
 
-    def eval(self, value):
-        return value != self.is_negated
+def from_arena(arena: ClauseArena):
+    formula = Formula(arena.num_of_vars, len(arena))
+    for c in arena:
+        formula.add_clause(c)
+    return formula
 
 
 def read_file(filename: str):
-    with open(filename, "r") as file:
-        line = file.readline()
-        while line[0] == "c":
-            line = file.readline()
-        problem = line.split()
-        num_of_vars = int(problem[2])
-        num_of_clauses = int(problem[3])
-        formula = Formula(num_of_vars, num_of_clauses)
-        for l in file:
-            if not l == "":
-                formula.add_clause(l.strip())
-        return formula
+    return from_arena(read_dimacs(filename))
 
 
 def write_output(file, solution):
@@ -209,83 +232,97 @@ def hexRepresentation(solution):
     return hex(ret)
 
 
-solution = []
-
-
-def dpll(formula):
-
-    if len(formula.clauses) == 0:
-        return solution
-    if formula.contains_empty():
-        return None
-    var, val = formula.find_unit_clause()
-    if var is not None:
-        f, clauses = formula.simplify(var, val)
-        if dpll(f) is not None:
-            solution.append((var, val))
-            return solution
-        else:
-            f.clauses += clauses
-            f.undo(var)
-            return None
-
-    var, val = formula.find_pure()
-    if var is not None:
-        f, clauses = formula.simplify(var,val)
-        if dpll(f) is not None:
-            solution.append((var,val))
-            return solution
-        else:
-            f.clauses += clauses
-            f.undo(var)
-            return None
-    else:
-        n, b = formula.get_literal()
-        f, clauses = formula.simplify(n, b)
-        if dpll(f) is not None:
-            solution.append((n, b))
-            return solution
-        f.clauses += clauses
-        f.undo(n)
-        f, clauses = f.simplify(n, not b)
-        if dpll(f) is not None:
-            solution.append((n, not b))
-            return solution
-        else:
-            f.clauses += clauses
-            f.undo(n)
-            return None
+def dpll(formula, stats=None):
+    # iterative DPLL on the trail of the formula: unit clauses first, then pure literals, then a decision
+    # on the literal with the most occurrences; returns the assignments of the trail or None
+    while True:
+        if formula.conflict:
+            if stats is not None:
+                stats.count("conflicts")
+                stats.progress(lambda: {"satisfied_clauses": len(formula.arena) - formula.unsatisfied})
+            if not formula.backtrack():
+                return None
+            continue
+        if formula.unsatisfied == 0:
+            return formula.model()
+        literal = formula.find_unit()
+        if literal is not None:
+            if stats is not None:
+                stats.count("units")
+            formula.assign(literal)
+            continue
+        literal = formula.find_pure()
+        if literal is not None:
+            if stats is not None:
+                stats.count("pure_literals")
+            formula.assign(literal)
+            continue
+        if stats is not None:
+            stats.count("decisions")
+        formula.decide(formula.get_literal())
 
 
 def check(formula, solution):
-    for idx, val in solution:
-        formula, _ = formula.simplify(idx, val)
-    if len(formula.clauses) == 0:
-        return True
-    return False
+    return verify(formula.arena, solution)[0]
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print("Usage: " + sys.argv[0] + " <input file> <output file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="DPLL SAT solver")
+    parser.add_argument("input", help="input file in DIMACS format")
+    parser.add_argument("output", help="output file for the solution")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="simplify the formula with subsumption and variable elimination first")
+    parser.add_argument("--stats", metavar="FILE", help="write statistics of the search as JSON at exit")
+    parser.add_argument("--progress", type=float, metavar="SECONDS",
+                        help="print a progress line to stderr every SECONDS")
+    parser.add_argument("--profile", metavar="FILE", help="profile the search with cProfile, pstats output")
+    args = parser.parse_args()
     verbose = True
     if verbose:
         print("Reading...")
-    formula = read_file(sys.argv[1])
+    dimacs = DimacsParser(args.input)
+    clauses = dimacs.parse()
+    if verbose:
+        for warning in dimacs.warnings:
+            print("Warning:", warning)
+        print(f"Read {len(clauses)} clauses in {dimacs.seconds:.3f} s ({dimacs.throughput():.1f} MB/s)")
+    preprocessor = None
+    if args.preprocess:
+        if verbose:
+            print("Preprocessing...")
+        preprocessor = Preprocessor(clauses)
+        clauses = preprocessor.run()
+        if verbose:
+            print(preprocessor.report())
+    formula = from_arena(clauses)
     if verbose:
         print("Solving...")
+    stats = None
+    if args.stats is not None or args.progress is not None:
+        stats = Stats(args.progress)
+        stats.instrument(formula, ["assign", "unassign", "find_unit", "find_pure", "get_literal"])
+    hooks = [ProfileHook(args.profile)] if args.profile is not None else []
     start = time()
-    s = dpll(formula)
+    for hook in hooks:
+        hook.on_search_start(None)
+    try:
+        s = dpll(formula, stats)
+    finally:
+        for hook in hooks:
+            hook.on_search_end(None)
+        if args.stats is not None:
+            stats.dump(args.stats)
+    if s is not None and preprocessor is not None:
+        s = preprocessor.extend_model(s)
     end = time()
     print('time',end-start)
     if verbose:
         print("Printing...")
     #prettyPrintResult(s)
     #print(hexRepresentation(s))
-    #print(hexRepresentation(readSolution(sys.argv[2])))
-    #print(check(read_file(sys.argv[1]), s))
-    write_output(sys.argv[2], s)
+    #print(hexRepresentation(readSolution(args.output)))
+    #print(check(read_file(args.input), s))
+    write_output(args.output, s)
 
     '''
     # sudoku print
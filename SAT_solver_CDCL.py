@@ -1,377 +1,1067 @@
+import argparse
+import random
+import resource
+import signal
 import sys
-import numpy as np
+from array import array
+from collections import deque
 from time import time
+from cache import ResultCache, formula_key
+from cardinality import find_at_most_one
+from cnf import CARDINALITY, ClauseArena
+from dimacs import DimacsParser, read_dimacs
+from local_search import ALGORITHMS, LocalSearch
+from proof import ProofWriter
+from preprocess import Preprocessor
+from stats import ProfileHook, Stats
+from verify import verify
+
+
+class LearnedClauses:
+    # induced clauses kept apart from the formula so that they can be deleted, with the
+    # literal block distance (number of decision levels) and activity of every clause;
+    # clause i of the store is referenced as learned_ref(i) = -2-i by the solver
+    def __init__(self):
+        self.clauses = ClauseArena()
+        self.lbd = array('i')
+        self.activity = array('d')
+        self.deleted = array('b')
+        self.clause_inc = 1.0
+        self.clause_decay = 0.999
+        self.num_deleted = 0
+
+    def __len__(self):
+        return len(self.clauses) - self.num_deleted
+
+    def add(self, literals: list, lbd: int):
+        self.lbd.append(lbd)
+        self.activity.append(self.clause_inc)
+        self.deleted.append(0)
+        return learned_ref(self.clauses.add_clause(literals))
+
+    def bump(self, ref: int):
+        i = learned_ref(ref)
+        self.activity[i] += self.clause_inc
+        if self.activity[i] > 1e20:
+            for j in range(len(self.activity)):
+                self.activity[j] *= 1e-20
+            self.clause_inc *= 1e-20
+
+    def decay(self):
+        self.clause_inc /= self.clause_decay
+
+    def delete(self, ref: int):
+        self.deleted[learned_ref(ref)] = 1
+        self.num_deleted += 1
+
+    def compact(self):
+        # drop the deleted clauses from the arena, returns {old reference: new reference}
+        clauses, lbd, activity, deleted = self.clauses, self.lbd, self.activity, self.deleted
+        self.clauses = ClauseArena()
+        self.lbd = array('i')
+        self.activity = array('d')
+        self.deleted = array('b')
+        self.num_deleted = 0
+        moved = dict()
+        for i in range(len(clauses)):
+            if not deleted[i]:
+                self.lbd.append(lbd[i])
+                self.activity.append(activity[i])
+                self.deleted.append(0)
+                moved[learned_ref(i)] = learned_ref(self.clauses.add_clause(clauses[i]))
+        return moved
+
+    def nbytes(self):
+        return self.clauses.nbytes() + self.lbd.itemsize*len(self.lbd) + \
+            self.activity.itemsize*len(self.activity) + self.deleted.itemsize*len(self.deleted)
+
+
+def learned_ref(i: int):
+    # maps an index of the learned clause store to a clause reference and back,
+    # references of clauses from the formula are their indices, -1 means no clause
+    return -2 - i
 
 
 class Formula:
-    def __init__(self, src_path: str):
-        self.sat_clauses = []
-        self.unsat_clauses = []
-        with open(src_path, "r") as file:
-            line = file.readline()
-            while line[0] == "c":
-                line = file.readline()
-            self.num_of_vars = int(line.split()[2])
-            self.negated = [0]*(self.num_of_vars+1)
-            self.non_negated = [0]*(self.num_of_vars+1)
-            for l in file:
-                if not l == "":
-                    self.add_clause(l.strip())
+    def __init__(self, src):
+        # src is the path of a DIMACS file or a ClauseArena
+        if isinstance(src, str):
+            src = read_dimacs(src)
+        self.clauses = src
+        self.learnts = LearnedClauses()
+        self.units = []  # clauses with a single literal cannot be watched, they are checked directly
+        self.num_of_vars = src.num_of_vars
+        # value of every literal: 1 (true), -1 (false) or 0 (unassigned)
+        self.values = array('b', [0])*(2*(self.num_of_vars+1))
+        self.watches = [[] for _ in range(2*(self.num_of_vars+1))]  # {literal: references of clauses watching it}
+        for clause in range(len(self.clauses)):
+            self.watch(clause)
+        # at-most-k constraints: literals, bound and the number of their true literals propagated so far;
+        # a constraint that propagates or fails explains itself with a clause in explanations, the one
+        # of variable v at v and the one of the last conflict at 0
+        self.cards = []
+        self.card_bound = array('i')
+        self.card_count = array('i')
+        self.card_occurs = [[] for _ in range(2*(self.num_of_vars+1))]  # {literal: constraints with it}
+        self.explanations = [None]*(self.num_of_vars+1)
 
     def __str__(self):
-        return " ∧ ".join([str(c) for c in self.unsat_clauses])
-
-    def add_clause(self, clause_str: str):
-        self.unsat_clauses.append(Clause(self, clause_str))
-
-    def simplify(self, number: int, value: bool):
-        # returns the list of newly satisfied clauses
-        sat_clauses = []
-        unsat_clauses = []
-        for c in self.unsat_clauses:
-            c.apply(number, value)
-            if c.is_solved:
-                sat_clauses.append(c)
+        return str(self.clauses)
+
+    def add_clause(self, literals: list):
+        clause = self.clauses.add_clause(literals)
+        self.watch(clause)
+        return clause
+
+    def add_at_most(self, literals: list, k: int):
+        # at most k of the literals are true (a literal given twice counts twice), the literals true now
+        # are counted as propagated already
+        literals = list(literals)
+        c = len(self.cards)
+        self.cards.append(literals)
+        self.card_bound.append(k)
+        self.card_count.append(sum(self.values[l] == 1 for l in literals))
+        for l in literals:
+            self.card_occurs[l].append(c)
+        return c
+
+    def add_vars(self, num_of_vars: int):
+        # grow the formula to num_of_vars variables
+        grow = num_of_vars - self.num_of_vars
+        if grow > 0:
+            self.values.extend(array('b', [0])*(2*grow))
+            self.watches.extend([] for _ in range(2*grow))
+            self.card_occurs.extend([] for _ in range(2*grow))
+            self.explanations.extend([None]*grow)
+            self.num_of_vars = num_of_vars
+            self.clauses.num_of_vars = num_of_vars
+
+    def clause(self, ref: int):
+        # literals of the referenced clause
+        if ref >= 0:
+            return self.clauses[ref]
+        return self.learnts.clauses[learned_ref(ref)]
+
+    def explanation(self, ref: int, var: int):
+        # literals of the clause that implied the variable, of the conflict for var 0
+        if ref == CARDINALITY:
+            return self.explanations[var]
+        return self.clause(ref)
+
+    def watch(self, ref: int):
+        # the first two literals of a clause are watched
+        literals = self.clause(ref)
+        if len(literals) > 1:
+            self.watches[literals[0]].append(ref)
+            self.watches[literals[1]].append(ref)
+        elif ref >= 0:
+            self.units.append(ref)
+
+    def assign(self, literal: int):
+        self.values[literal] = 1
+        self.values[literal ^ 1] = -1
+
+    def unassign(self, number: int):
+        # watches stay valid when an assignment is undone, so there is nothing else to restore
+        self.values[2*number] = 0
+        self.values[2*number+1] = 0
+
+    def propagate(self, literal: int):
+        # visits only the clauses watching the literal falsified by the assignment,
+        # returns the list of implied (literal, clause) pairs and the falsified clause (or None)
+        implied = []
+        if len(self.card_occurs[literal]) > 0 and self.propagate_cards(literal, implied):
+            return implied, CARDINALITY
+        false_lit = literal ^ 1
+        original = self.clauses
+        learned = self.learnts.clauses
+        values = self.values
+        watchers = self.watches[false_lit]
+        kept = []
+        self.watches[false_lit] = kept
+        for i, clause in enumerate(watchers):
+            if clause >= 0:
+                lits = original.lits
+                start = original.starts[clause]
+                end = start + original.sizes[clause]
             else:
-                unsat_clauses.append(c)
-        self.sat_clauses.extend(sat_clauses)
-        self.unsat_clauses = unsat_clauses
-        return sat_clauses
-
-    def undo(self, number: int, modified: list = None):
-        for c in self.unsat_clauses:
-            c.undo(number)
-        if modified == None:
-            for c in self.sat_clauses[:]:
-                c.undo(number)
-                if not c.is_solved:
-                    self.sat_clauses.remove(c)
-                    self.unsat_clauses.append(c)
-        else:
-            for c in modified:
-                c.undo(number)
-                self.sat_clauses.remove(c)
-                self.unsat_clauses.append(c)
-
-    def find_unit_clause(self):
-        for c in self.unsat_clauses:
-            if len(c) == 1:
-                unused = c.unused_literals[0]
-                return (unused.number, not unused.is_negated), [i.number for i in c.used_literals]
-        return None, None
-
-    def contains_empty(self):
-        for c in self.unsat_clauses:
-            if len(c) == 0:
+                lits = learned.lits
+                start = learned.starts[-2-clause]
+                end = start + learned.sizes[-2-clause]
+            if lits[start] == false_lit:
+                lits[start] = lits[start+1]
+                lits[start+1] = false_lit
+            first = lits[start]
+            if values[first] == 1:
+                kept.append(clause)
+                continue
+            for k in range(start+2, end):
+                if values[lits[k]] != -1:
+                    # found a new literal to watch
+                    lits[start+1] = lits[k]
+                    lits[k] = false_lit
+                    self.watches[lits[start+1]].append(clause)
+                    break
+            else:
+                kept.append(clause)
+                if values[first] == 0:
+                    self.assign(first)
+                    implied.append((first, clause))
+                else:
+                    kept.extend(watchers[i+1:])
+                    return implied, clause
+        return implied, None
+
+    def propagate_cards(self, literal: int, implied: list):
+        # counts the true literal in its constraints, the other literals of a constraint with k true
+        # ones become false; returns True on a conflict (more than k true literals)
+        values, counts, bounds = self.values, self.card_count, self.card_bound
+        full = []
+        for c in self.card_occurs[literal]:
+            counts[c] += 1
+            if counts[c] >= bounds[c]:
+                full.append(c)
+        for c in full:
+            true = [l for l in self.cards[c] if values[l] == 1]
+            k = bounds[c]
+            if len(true) > k:
+                # k+1 of the true literals, the new one among them, cannot all be true
+                self.explanations[0] = [literal ^ 1] + [l ^ 1 for l in true if l != literal][:k]
                 return True
+            reason = [l ^ 1 for l in true]
+            for l in self.cards[c]:
+                if values[l] == 0:
+                    self.assign(l ^ 1)
+                    self.explanations[l >> 1] = [l ^ 1] + reason
+                    implied.append((l ^ 1, CARDINALITY))
         return False
 
-    def find_empty_clause(self):
-        for c in self.unsat_clauses:
-            if len(c) == 0:
-                return [i.number for i in c.used_literals]
-        return None
+    def uncount(self, literal: int):
+        # the propagated literal is unassigned again
+        for c in self.card_occurs[literal]:
+            self.card_count[c] -= 1
+
+    def rewrite(self, mapping: list, proof: ProofWriter = None):
+        # Rewrites all clauses on level 0: every literal l becomes mapping[l], literals false on level 0 are
+        # left out, tautologies and satisfied clauses are dropped and the watches are built again, so the
+        # old clause references are not valid any more. Returns the literals of the clauses that became
+        # unit, or None when a clause became empty.
+        values = self.values
+        units = []
+        added, deleted = [], []
 
-    def find_pure(self):
-        for i,(n1,n2) in enumerate(zip(self.negated,self.non_negated)):
-            if n1 == 0 and n2 > 0:
-                return i, True
-            elif n2 == 0 and n1 > 0:
-                return i, False
-        return None, None
-
-    def add_induced_clause(self, causes):
-        new_clause = Clause(self, None)
-        for c in causes: # c = (int, bool)
-            new_literal = Literal(new_clause, None)
-            new_literal.number = c[0]
-            new_literal.is_negated = c[1] # value of literal must be false with current assignment
-            new_clause.used_literals.append(new_literal)
-        self.unsat_clauses.append(new_clause)
+        def rewritten(c):
+            # the new literals of the clause, None if it is dropped
+            if any(values[l] == 1 for l in c):
+                # satisfied clauses may be the reasons of level 0 assignments, so they stay in the proof
+                return None
+            literals = list(dict.fromkeys(mapping[l] for l in c))
+            if any(values[l] == 1 or l ^ 1 in literals for l in literals):
+                deleted.append(c)
+                return None
+            literals = [l for l in literals if values[l] != -1]
+            if literals != list(c):
+                added.append(literals)
+                deleted.append(c)
+            return literals
+
+        clauses = ClauseArena(self.num_of_vars)
+        for c in self.clauses:
+            literals = rewritten(c)
+            if literals is not None and len(literals) > 1:
+                clauses.add_clause(literals)
+            elif literals is not None:
+                units.append(literals)
+        learnts = LearnedClauses()
+        learnts.clause_inc = self.learnts.clause_inc
+        for i, c in enumerate(self.learnts.clauses):
+            if self.learnts.deleted[i]:
+                continue
+            literals = rewritten(c)
+            if literals is not None and len(literals) > 1:
+                ref = learnts.add(literals, min(self.learnts.lbd[i], len(literals)))
+                learnts.activity[learned_ref(ref)] = self.learnts.activity[i]
+            elif literals is not None:
+                units.append(literals)
+        if proof is not None:
+            # the new clauses follow from the old ones, so they are added before the old ones are deleted
+            for literals in added:
+                proof.add(literals)
+            for c in deleted:
+                proof.delete(c)
+        self.clauses = clauses
+        self.learnts = learnts
+        self.units = []
+        self.watches = [[] for _ in range(len(values))]
+        for clause in range(len(clauses)):
+            self.watch(clause)
+        for ref in range(len(learnts.clauses)):
+            self.watch(learned_ref(ref))
+        if any(len(u) == 0 for u in units):
+            return None
+        return [u[0] for u in units]
+
+    def add_induced_clause(self, literals: list, lbd: int):
+        # the first two literals are watched, they have to be the ones unassigned first on backjumping
+        ref = self.learnts.add(literals, lbd)
+        self.watch(ref)
+        return ref
 
     def get_literal(self):
-        lit1 = np.argmax(self.negated)
-        lit2 = np.argmax(self.non_negated)
-        if self.negated[lit1] > self.non_negated[lit2]:
-            return lit1, False
+        # the literal with the most occurrences in clauses that are not satisfied yet,
+        # None when every clause is satisfied
+        counts = [0]*len(self.values)
+        values = self.values
+        for c in self.clauses:
+            free = []
+            for l in c:
+                if values[l] == 1:
+                    break
+                if values[l] == 0:
+                    free.append(l)
+            else:
+                for l in free:
+                    counts[l] += 1
+        lit1 = max(range(1, len(counts), 2), key=counts.__getitem__)
+        lit2 = max(range(0, len(counts), 2), key=counts.__getitem__)
+        if counts[lit1] == 0 and counts[lit2] == 0:
+            return None, None
+        if counts[lit1] > counts[lit2]:
+            return lit1 >> 1, False
         else:
-            return lit2, True
+            return lit2 >> 1, True
 
 
-class Clause:
-    def __init__(self, f: Formula, clause_str: str):
-        self.super = f
-        self.unused_literals = []
-        self.used_literals = []
-        self.is_solved = False
-        self.solving_var = None
-        if clause_str is not None:
-            literals = clause_str.split()
-            for l in literals[:-1]:
-                self.unused_literals.append(Literal(self, l))
+def luby(i: int):
+    # i-th element (from 1) of the Luby sequence 1 1 2 1 1 2 4 1 1 2 1 1 2 4 8 ...
+    while True:
+        k = i.bit_length()
+        if i == (1 << k) - 1:
+            return 1 << (k-1)
+        i -= (1 << (k-1)) - 1
 
-    def __str__(self):
-        return f"({' ∨ '.join([str(l) for l in self.unused_literals])}"
 
-    def __repr__(self): # for debugging purposes
-        return str([str(i) for i in self.unused_literals])
+class LubyRestarts:
+    # restart after unit * luby(n) conflicts
+    def __init__(self, unit: int = 100):
+        self.unit = unit
+        self.count = 1
+        self.conflicts = 0
+
+    def on_conflict(self, lbd: int):
+        self.conflicts += 1
+
+    def should_restart(self):
+        return self.conflicts >= self.unit*luby(self.count)
+
+    def on_restart(self):
+        self.count += 1
+        self.conflicts = 0
+
+
+class GlucoseRestarts:
+    # restart when the clauses learned recently are worse (higher LBD) than the average
+    def __init__(self, window: int = 50, k: float = 0.8):
+        self.recent = deque(maxlen=window)
+        self.recent_sum = 0
+        self.total_sum = 0
+        self.conflicts = 0
+        self.k = k
+
+    def on_conflict(self, lbd: int):
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_sum -= self.recent[0]
+        self.recent.append(lbd)
+        self.recent_sum += lbd
+        self.total_sum += lbd
+        self.conflicts += 1
+
+    def should_restart(self):
+        return len(self.recent) == self.recent.maxlen and \
+            self.recent_sum/len(self.recent)*self.k > self.total_sum/self.conflicts
+
+    def on_restart(self):
+        self.recent.clear()
+        self.recent_sum = 0
+
+
+class NoRestarts:
+    def on_conflict(self, lbd: int):
+        pass
+
+    def should_restart(self):
+        return False
+
+    def on_restart(self):
+        pass
+
+
+RESTARTS = {"luby": LubyRestarts, "glucose": GlucoseRestarts, "none": NoRestarts}
+
+
+class VarHeap:
+    # binary max-heap of variables ordered by activity,
+    # indices[v] is the position of the variable v in the heap or -1
+    def __init__(self, activity):
+        self.activity = activity
+        self.heap = []
+        self.indices = array('i', [-1])*len(activity)
 
     def __len__(self):
-        return len(self.unused_literals)
+        return len(self.heap)
 
-    def apply(self, number: int, value: bool):
-        literals = list(filter(lambda l: l.number == number, self.unused_literals))
-        if len(literals) > 0:
-            for l in literals:
-                if l.eval(value):
-                    self.is_solved = True
-                    self.solving_var = number
-            if self.is_solved:
-                for l in self.unused_literals:
-                    if l.is_negated:
-                        self.super.negated[l.number] -= 1
-                    else:
-                        self.super.non_negated[l.number] -= 1
+    def __contains__(self, var: int):
+        return self.indices[var] >= 0
+
+    def push(self, var: int):
+        if self.indices[var] >= 0:
+            return
+        self.indices[var] = len(self.heap)
+        self.heap.append(var)
+        self.sift_up(len(self.heap) - 1)
+
+    def pop(self):
+        top = self.heap[0]
+        last = self.heap.pop()
+        self.indices[top] = -1
+        if len(self.heap) > 0:
+            self.heap[0] = last
+            self.indices[last] = 0
+            self.sift_down(0)
+        return top
+
+    def increase(self, var: int):
+        # the activity of the variable grew
+        if self.indices[var] >= 0:
+            self.sift_up(self.indices[var])
+
+    def sift_up(self, i: int):
+        heap, activity, indices = self.heap, self.activity, self.indices
+        var = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if activity[heap[parent]] >= activity[var]:
+                break
+            heap[i] = heap[parent]
+            indices[heap[i]] = i
+            i = parent
+        heap[i] = var
+        indices[var] = i
+
+    def sift_down(self, i: int):
+        heap, activity, indices = self.heap, self.activity, self.indices
+        var = heap[i]
+        while 2*i + 1 < len(heap):
+            child = 2*i + 1
+            if child + 1 < len(heap) and activity[heap[child+1]] > activity[heap[child]]:
+                child += 1
+            if activity[heap[child]] <= activity[var]:
+                break
+            heap[i] = heap[child]
+            indices[heap[i]] = i
+            i = child
+        heap[i] = var
+        indices[var] = i
+
+
+BRANCHING = ["evsids", "vsids", "occurrence"]
+PHASES = ["false", "true", "random"]
+
+
+class CDCL:
+    def __init__(self, f: Formula, restarts: str = "luby", branching: str = "evsids",
+                 reduce_interval: int = 2000, reduce_increment: int = 300, max_learned_bytes: int = None,
+                 initial_phase: str = "false", seed: int = None, stats: Stats = None):
+        self.formula = f
+        self.restart_policy = RESTARTS[restarts]()
+        self.branching = branching
+        self.conflicts = 0
+        self.restarts = 0
+        # the learned clause store is reduced after reduce_interval conflicts, then the interval
+        # grows by reduce_increment, or earlier when it takes more than max_learned_bytes
+        self.reduce_interval = reduce_interval
+        self.reduce_increment = reduce_increment
+        self.max_learned_bytes = max_learned_bytes
+        self.next_reduce = reduce_interval
+        self.reductions = 0
+        # evsids bumps by a growing increment (= decays all activities), vsids bumps by one and
+        # halves all activities every 256 conflicts, occurrence uses Formula.get_literal
+        self.activity = array('d', [0.0])*(f.num_of_vars+1)
+        self.var_inc = 1.0
+        self.var_decay = 0.95
+        # a seed shuffles the initial order of the variables with tiny activities
+        self.random = random.Random(seed)
+        if seed is not None:
+            for var in range(1, f.num_of_vars+1):
+                self.activity[var] = self.random.random()*1e-5
+        self.order = VarHeap(self.activity) # unassigned variables by activity
+        for var in range(1, f.num_of_vars+1):
+            self.order.push(var)
+        self.phase = array('b', [initial_phase == "true"])*(f.num_of_vars+1) # last value of every variable
+        if initial_phase == "random":
+            for var in range(1, f.num_of_vars+1):
+                self.phase[var] = self.random.random() < 0.5
+        self.trail = [] # assigned literals in the order of assignment
+        self.trail_lim = [] # trail_lim[d-1] is the position on the trail where level d starts
+        self.level = array('i', [0])*(f.num_of_vars+1) # decision level of every variable
+        self.reason = array('i', [-1])*(f.num_of_vars+1) # clause that implied the variable, -1 if decided
+        self.seen = array('b', [0])*(f.num_of_vars+1) # marks used by conflict analysis
+        self.propagated = 0 # literals in trail[:propagated] were already propagated
+        self.induced = None # last induced clause, its first literal is asserted after backjumping
+        self.assumptions = [] # literals decided first, one per level, in the current call of solve
+        self.core = [] # assumptions that made the formula unsatisfiable in the last call of solve
+        self.unsatisfiable = False # the formula is unsatisfiable without any assumptions
+        self.propagations = 0 # literals propagated in all calls of solve
+        # budgets of the current call of solve, checked at every conflict and restart
+        self.deadline = None
+        self.max_conflicts = None
+        self.max_propagations = None
+        self.max_memory = None
+        self.interrupted = False # set by interrupt, cleared only by clear_interrupt
+        self.status = None # SAT, UNSAT or UNKNOWN after solve
+        self.stopped = None # budget that stopped the last call of solve: time, conflicts, propagations, memory, interrupt
+        # exchange of induced clauses with other solvers (see portfolio.py), it has export(literals, lbd)
+        # called for every induced clause and receive() returning clauses induced by the others
+        self.exchange = None
+        # optional DRAT proof (see proof.py), gets every induced and deleted clause and the empty clause;
+        # it proves the unsatisfiability of the formula without assumptions, added clauses or exchange
+        self.proof = None
+        # optional inprocessing on level 0 (see inprocess.py), before the search and between restarts; it may
+        # replace variables with equivalent literals, equivalent[v] is the literal that replaced v and
+        # substituted lists the replacements in their order for the reconstruction of models
+        self.inprocessor = None
+        self.equivalent = dict()
+        self.substituted = []
+        # optional statistics with the time spent in every phase, and SearchHooks (see stats.py)
+        self.stats = stats
+        self.hooks = []
+        if stats is not None:
+            stats.instrument(self, ["decide", "deduce", "diagnose", "erase", "reduce_learned"])
+
+    # Solve the formula under the assumptions (literals that have to be true), returns a list of
+    # (variable, value) or None. solve can be called again after add_clause or with other assumptions,
+    # induced clauses, activities and saved phases are kept between the calls.
+    # The search gives up when one of the budgets of this call (seconds, conflicts, propagations, MB of
+    # peak memory of the process) is used up or after interrupt; then None is returned as well and status
+    # is UNKNOWN instead of UNSAT, stopped tells why. The solver can be used again after that.
+    def solve(self, assumptions: list = (), time_limit: float = None, conflicts: int = None,
+              propagations: int = None, memory_mb: float = None):
+        self.erase(1)
+        self.core = []
+        self.stopped = None
+        self.status = "UNSAT"
+        self.add_vars(max(assumptions, default=0) >> 1)
+        self.assumptions = [self.representative(l) for l in assumptions]
+        if self.unsatisfiable or not self.enqueue_units() or not self.inprocess():
+            if self.proof is not None and len(self.assumptions) == 0:
+                self.proof.add([])
+            return None
+        self.deadline = None if time_limit is None else time() + time_limit
+        self.max_conflicts = None if conflicts is None else self.conflicts + conflicts
+        self.max_propagations = None if propagations is None else self.propagations + propagations
+        self.max_memory = None if memory_mb is None else memory_mb*2**20
+        for hook in self.hooks:
+            hook.on_search_start(self)
+        try:
+            found = self.search()
+        finally:
+            for hook in self.hooks:
+                hook.on_search_end(self)
+        if len(self.core) > 0 and len(self.equivalent) > 0:
+            core = set(self.core)
+            self.core = [l for l in assumptions if self.representative(l) in core]
+        if found:
+            self.status = "SAT"
+            return self.model()
+        if found is None:
+            self.status = "UNKNOWN"
+            self.erase(1)
+        return None
+
+    # the assignment on the trail together with the values of the substituted variables
+    def model(self):
+        values = dict((l >> 1, not l & 1) for l in self.trail)
+        # occurrence branching stops when every clause is satisfied, the other variables may take any value
+        for var in range(1, self.formula.num_of_vars+1):
+            if var not in values and var not in self.equivalent:
+                values[var] = False
+        for var, literal in reversed(self.substituted):
+            values[var] = values[literal >> 1] != bool(literal & 1)
+        return list(values.items())
+
+    # the literal that stands for the literal in the formula, after all substitutions
+    def representative(self, literal: int):
+        while literal >> 1 in self.equivalent:
+            literal = self.equivalent[literal >> 1] ^ (literal & 1)
+        return literal
+
+    # run the inprocessor if it is due, return False if it found the formula unsatisfiable
+    def inprocess(self):
+        if self.inprocessor is None or self.conflicts < self.inprocessor.next_round:
+            return True
+        self.erase(1)
+        if not self.inprocessor.run(self):
+            self.unsatisfiable = True
+            return False
+        return True
+
+    # solve with the status: returns (SAT, model, None), (UNSAT, None, None) or (UNKNOWN, None, budget)
+    def solve_limited(self, assumptions: list = (), **budgets):
+        model = self.solve(assumptions, **budgets)
+        return self.status, model, self.stopped
+
+    # Yields the models one after another, each model is blocked by a clause before the next call of solve,
+    # so induced clauses, activities and phases carry over from model to model. With projection (a list
+    # of variables) only the values of those variables are yielded and blocked, every assignment of them
+    # is yielded once. Stops after limit models, when there are no more or when a budget of solve (for all
+    # models together) is used up; status tells which.
+    def models(self, projection: list = None, limit: int = None, assumptions: list = (), **budgets):
+        start, conflicts, propagations = time(), self.conflicts, self.propagations
+        count = 0
+        while limit is None or count < limit:
+            left = dict(budgets)
+            if left.get("time_limit") is not None:
+                left["time_limit"] -= time() - start
+            if left.get("conflicts") is not None:
+                left["conflicts"] -= self.conflicts - conflicts
+            if left.get("propagations") is not None:
+                left["propagations"] -= self.propagations - propagations
+            model = self.solve(assumptions, **left)
+            if model is None:
+                return
+            if projection is not None:
+                values = dict(model)
+                model = [(var, values.get(var, False)) for var in projection]
+                blocking = [2*var + val for var, val in model]
+            elif len(self.trail) + len(self.equivalent) == self.formula.num_of_vars:
+                # the decisions imply the rest of the model, so negating them blocks this model alone
+                blocking = [l ^ 1 for l in self.trail if self.reason[l >> 1] == -1 and self.level[l >> 1] > 0]
             else:
-                for l in literals:
-                    self.unused_literals.remove(l)
-                    self.used_literals.append(l)
-                    if l.is_negated:
-                        self.super.negated[l.number] -= 1
-                    else:
-                        self.super.non_negated[l.number] -= 1
-
-    def undo(self, number: int):
-        # literals = filter(lambda l: l.number == number, self.used_literals)
-        if self.is_solved:
-            if self.solving_var == number:
-                self.is_solved = False
-                self.solving_var = None
-                for l in self.unused_literals:
-                    if l.is_negated:
-                        self.super.negated[l.number]+=1
-                    else:
-                        self.super.non_negated[l.number]+=1
-        else:
-            for l in self.used_literals:
-                if l.number == number:
-                    self.unused_literals.append(l)
-                    self.used_literals.remove(l)
-                    if l.is_negated:
-                        self.super.negated[number] += 1
-                    else:
-                        self.super.non_negated[number] += 1
-
-
-class Literal:
-    def __init__(self, c: Clause, literal_str):
-        self.super = c
-        self.is_negated = False
-        self.number = 0
-        if literal_str is not None:
-            if literal_str[0] == '-':
-                self.is_negated = True
-                literal_str = literal_str[1:]
-                c.super.negated[int(literal_str)] += 1
+                # a partial assignment (occurrence branching) would block all of its extensions as well
+                blocking = [2*var + val for var, val in model]
+            yield model
+            count += 1
+            self.add_clause(blocking)
+
+    # Stop the search at the next conflict or restart, the call of solve returns UNKNOWN. Only sets a flag,
+    # so it can be called from another thread or a signal handler while the solver is searching.
+    def interrupt(self):
+        self.interrupted = True
+
+    def clear_interrupt(self):
+        self.interrupted = False
+
+    # the budget that is used up, or None
+    def out_of_budget(self):
+        if self.interrupted:
+            return "interrupt"
+        if self.deadline is not None and time() >= self.deadline:
+            return "time"
+        if self.max_conflicts is not None and self.conflicts >= self.max_conflicts:
+            return "conflicts"
+        if self.max_propagations is not None and self.propagations >= self.max_propagations:
+            return "propagations"
+        if self.max_memory is not None and \
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024 >= self.max_memory:
+            return "memory"
+        return None
+
+    # counters of the solver for Stats
+    def counters(self):
+        return {"conflicts": self.conflicts, "restarts": self.restarts, "reductions": self.reductions,
+                "learned_kept": len(self.formula.learnts)}
+
+    # put the literals of unit clauses on level 0, return False if the clauses contradict each other
+    def enqueue_units(self):
+        for clause in self.formula.units:
+            if self.formula.clauses.sizes[clause] == 0:
+                self.unsatisfiable = True
+                return False
+            literal = self.formula.clause(clause)[0]
+            if self.formula.values[literal] == -1:
+                self.unsatisfiable = True
+                return False
+            if self.formula.values[literal] == 0:
+                self.enqueue(literal, clause)
+        return True
+
+    # add the clauses received from other solvers on level 0 as induced clauses,
+    # return False if they make the formula unsatisfiable
+    def import_clauses(self):
+        values = self.formula.values
+        for literals, lbd in self.exchange.receive():
+            if len(self.equivalent) > 0:
+                literals = list(dict.fromkeys(self.representative(l) for l in literals))
+            if any(values[l] == 1 for l in literals):
+                continue
+            literals = [l for l in literals if values[l] != -1]
+            if len(literals) == 0:
+                self.unsatisfiable = True
+                return False
+            if len(literals) == 1:
+                # a fact on level 0 needs no reason
+                self.enqueue(literals[0], -1)
             else:
-                c.super.non_negated[int(literal_str)] += 1
-            self.number = int(literal_str)
+                self.formula.add_induced_clause(literals, min(lbd, len(literals)))
+        return True
 
-    def __str__(self):
-        return f"{'-' if self.is_negated else ''}{self.number}"
+    # add a clause to the formula between calls of solve, new variables are created as needed
+    def add_clause(self, literals: list):
+        self.erase(1)
+        self.add_vars(max(literals, default=0) >> 1)
+        values = self.formula.values
+        literals = list(dict.fromkeys(self.representative(l) for l in literals))
+        if any(values[l] == 1 or l ^ 1 in literals for l in literals):
+            # satisfied by the assignments on level 0 or tautology
+            return
+        # literals false on level 0 stay false, so they are left out
+        self.formula.add_clause([l for l in literals if values[l] != -1])
 
-    def eval(self, value):
-        return value != self.is_negated
+    # add the constraint that at most k of the literals are true between calls of solve
+    def add_at_most(self, literals: list, k: int):
+        self.erase(1)
+        self.add_vars(max(literals, default=0) >> 1)
+        literals = [self.representative(l) for l in literals]
+        if self.deduce() is not None:
+            # the constraint counts the literals propagated on level 0, so all of them have to be
+            self.unsatisfiable = True
+        c = self.formula.add_at_most(literals, k)
+        literals = self.formula.cards[c]
+        values = self.formula.values
+        true = [l for l in literals if values[l] == 1]
+        if len(true) > k:
+            self.unsatisfiable = True
+        elif len(true) == k:
+            for l in literals:
+                if values[l] == 0:
+                    self.formula.explanations[l >> 1] = [l ^ 1] + [t ^ 1 for t in true]
+                    self.enqueue(l ^ 1, CARDINALITY)
 
+    def add_at_most_one(self, literals: list):
+        self.add_at_most(literals, 1)
 
-class Graph:  # class that represents a directed graph
-    class Node:
-        def __init__(self, label):
-            self.label = label
-            self.prev = []  # list of nodes
-            self.next = []
+    def add_vars(self, num_of_vars: int):
+        grow = num_of_vars - self.formula.num_of_vars
+        if grow <= 0:
+            return
+        self.formula.add_vars(num_of_vars)
+        self.activity.extend(array('d', [0.0])*grow)
+        self.order.indices.extend(array('i', [-1])*grow)
+        self.phase.extend(array('b', [0])*grow)
+        self.level.extend(array('i', [0])*grow)
+        self.reason.extend(array('i', [-1])*grow)
+        self.seen.extend(array('b', [0])*grow)
+        for var in range(num_of_vars - grow + 1, num_of_vars + 1):
+            self.order.push(var)
 
-    def __init__(self):
-        self.V = dict()  # {name: Node}
-
-    def __contains__(self, label):
-        return label in self.V
-
-    def add_node(self, label):
-        if label in self.V:
-            raise NameError(f"Node {label} already exists!")
-        newNode = self.Node(label)
-        self.V[label] = newNode
-
-    def delete_node(self, label):
-        if label in self.V:
-            node = self.V[label]
-            for e in node.prev:
-                e.next.remove(node)
-            for e in node.next:
-                e.prev.remove(node)
-            del node
-            del self.V[label]
-        else:
-            NameError(f"Node {label} does not exist!")
-
-    def connect(self, start, end):
-        if start in self.V:
-            if end in self.V:
-                start_node = self.V[start]
-                end_node = self.V[end]
-                start_node.next.append(end_node)
-                end_node.prev.append(start_node)
+    # conflict driven search, return whether a solution was found
+    # returns True if a model was found, False if there is none and None if a budget was used up
+    def search(self):
+        while True:
+            propagated = self.propagated
+            conflict = self.deduce()
+            self.propagations += self.propagated - propagated
+            if self.stats is not None:
+                self.stats.count("propagations", self.propagated - propagated)
+            if conflict is not None:
+                self.conflicts += 1
+                if len(self.trail_lim) == 0:
+                    # conflict without decisions => unsatisfiable formula!
+                    self.unsatisfiable = True
+                    if self.proof is not None:
+                        self.proof.add([])
+                    return False
+                beta, lbd = self.diagnose(conflict)
+                if self.stats is not None:
+                    self.stats.learned(len(self.formula.clause(self.induced)), lbd)
+                    self.stats.count("backjumped_levels", len(self.trail_lim) - beta)
+                    self.stats.progress(self.counters)
+                # backjump to the level where the induced clause becomes unit
+                self.erase(beta + 1)
+                self.assert_induced()
+                if self.exchange is not None:
+                    self.exchange.export(self.formula.clause(self.induced), lbd)
+                self.restart_policy.on_conflict(lbd)
+                self.decay_activity()
+                self.formula.learnts.decay()
+                if self.conflicts >= self.next_reduce or self.max_learned_bytes is not None and \
+                        self.formula.learnts.nbytes() > self.max_learned_bytes:
+                    self.reduce_learned()
+                self.stopped = self.out_of_budget()
+                if self.stopped is not None:
+                    return None
+            elif self.restart_policy.should_restart():
+                # the induced clauses are kept, only the assignments are dropped
+                self.restarts += 1
+                self.restart_policy.on_restart()
+                self.erase(1)
+                if self.exchange is not None and not self.import_clauses():
+                    return False
+                if not self.inprocess():
+                    if self.proof is not None:
+                        self.proof.add([])
+                    return False
+                self.stopped = self.out_of_budget()
+                if self.stopped is not None:
+                    return None
+            elif len(self.trail_lim) < len(self.assumptions):
+                # the assumptions are decided before anything else, each on its own level
+                literal = self.assumptions[len(self.trail_lim)]
+                if self.formula.values[literal] == -1:
+                    self.core = self.analyze_final(literal)
+                    return False
+                self.trail_lim.append(len(self.trail))
+                if self.formula.values[literal] == 0:
+                    self.enqueue(literal, -1)
             else:
-                NameError(f"Node {end} does not exist!")
+                # the search may go on without conflicts for a long time (a decision with occurrence
+                # branching visits all clauses), so the budget is checked before every decision as well
+                self.stopped = self.out_of_budget()
+                if self.stopped is not None:
+                    return None
+                if self.decide():
+                    return True
+
+    # choose a variable assignment, return whether the formula is already solved
+    def decide(self):
+        if self.branching == "occurrence":
+            var, val = self.formula.get_literal()
+            if var is None:
+                # every clause is satisfied
+                return True
         else:
-            NameError(f"Node {start} does not exist!")
+            var = None
+            while len(self.order) > 0:
+                var = self.order.pop()
+                if self.formula.values[2*var] == 0 and var not in self.equivalent:
+                    break
+                var = None
+            if var is None:
+                # every variable is assigned
+                return True
+            val = self.phase[var] # saved phase
+        if self.stats is not None:
+            self.stats.count("decisions")
+        self.trail_lim.append(len(self.trail))
+        self.enqueue(2*var + (not val), -1)
+        return False
 
-    def prev(self, label):
-        if label in self.V:
-            return [i.label for i in self.V[label].prev]
+    def bump(self, var: int):
+        if self.branching == "vsids":
+            self.activity[var] += 1
         else:
-            NameError(f"Node {label} does not exist!")
+            self.activity[var] += self.var_inc
+            if self.activity[var] > 1e100:
+                # rescale before the activities overflow
+                for v in range(1, len(self.activity)):
+                    self.activity[v] *= 1e-100
+                self.var_inc *= 1e-100
+        self.order.increase(var)
 
-    def next(self, label):
-        if label in self.V:
-            return [i.label for i in self.V[label].next]
+    def decay_activity(self):
+        if self.branching == "vsids":
+            if self.conflicts % 256 == 0:
+                for v in range(1, len(self.activity)):
+                    self.activity[v] /= 2
         else:
-            NameError(f"Node {label} does not exist!")
+            self.var_inc /= self.var_decay
 
+    # add the literal to the trail on the current level
+    def enqueue(self, literal: int, reason: int):
+        self.formula.assign(literal)
+        self.level[literal >> 1] = len(self.trail_lim)
+        self.reason[literal >> 1] = reason
+        self.trail.append(literal)
 
-class CDCL:
-    def __init__(self, f: Formula):
-        self.formula = f
-        self.solution = [] # (int, bool) list
-        self.impl_graph = Graph()
-        self.graph_assigns = dict() # {int: (int, bool, int)}
-        self.conflict = None
-
-    def solve(self):
-        if self.search(0)[0]:
-            return [(i[0], i[1]) for i in self.solution]
+    # resolve all implications, return the falsified clause or None
+    def deduce(self):
+        while self.propagated < len(self.trail):
+            literal = self.trail[self.propagated]
+            self.propagated += 1
+            implied, conflict = self.formula.propagate(literal)
+            d = len(self.trail_lim)
+            for unit, clause in implied:
+                # propagate already assigned the value
+                self.level[unit >> 1] = d
+                self.reason[unit >> 1] = clause
+                self.trail.append(unit)
+            if conflict is not None:
+                return conflict
         return None
 
-    # search for a solution, return whether a solution was found
-    # and the backtracking decision level beta
-    def search(self, d: int):
-        if self.decide(d):
-            return True, None
+    # first UIP conflict analysis: learn a clause with a single literal from the current level,
+    # return the level beta where it becomes unit and its literal block distance
+    def diagnose(self, conflict: int):
+        level, reason, seen = self.level, self.reason, self.seen
+        learnts = self.formula.learnts
+        d = len(self.trail_lim)
+        learned = [0] # learned[0] is reserved for the asserting literal
+        counter = 0 # literals from the current level that are not resolved yet
+        var = 0
+        index = len(self.trail) - 1
+        clause = conflict
         while True:
-            # guard against infinite loop when formula is unsatisfiable
-            sol_len = len(self.solution)
-            if not self.deduce(d):
-                success, beta = self.search(d + 1)
-                if success:
-                    return True, None
-                elif beta != d:
-                    self.erase(d)
-                    return False, beta
-            elif sol_len == 0:
-                # conflict from empty solution => unsatisfiable formula!
-                return False, None
-            success, beta = self.diagnose(d)
-            if not success:
-                self.erase(d)
-                return False, beta
-            self.erase(d)
-
-    # choose a variable assignment, return whether the assignment solves the formula
-    def decide(self, d: int):
-        if len(self.formula.unsat_clauses) > 0:
-            var, val = self.formula.get_literal()
-            self.formula.simplify(var, val)
-            self.solution.append((var, val, d))
-            self.impl_graph.add_node((var, val, d))
-            self.graph_assigns[var] = (var, val, d)
-        if len(self.formula.unsat_clauses) == 0:
-            return True
-        return False
+            literals = self.formula.explanation(clause, var)
+            if clause < -1:
+                # induced clauses that take part in conflicts are worth keeping
+                learnts.bump(clause)
+                i = learned_ref(clause)
+                if learnts.lbd[i] > 2:
+                    learnts.lbd[i] = min(learnts.lbd[i], len(set(level[l >> 1] for l in literals)))
+            for l in literals:
+                v = l >> 1
+                if v != var and not seen[v] and level[v] > 0:
+                    seen[v] = 1
+                    self.bump(v)
+                    if level[v] == d:
+                        counter += 1
+                    else:
+                        learned.append(l)
+            # resolve with the reason of the latest marked literal
+            while not seen[self.trail[index] >> 1]:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            var = literal >> 1
+            seen[var] = 0
+            counter -= 1
+            if counter == 0:
+                break
+            clause = reason[var]
+        learned[0] = literal ^ 1
 
-    # find a conflict or resolve all implications, return whether a conflict occured
-    def deduce(self, d: int):
-        loop = True
-        while loop:
-            loop = False
-            unsat = self.formula.find_empty_clause() # None or int list
-            if unsat is not None:
-                # arrived at a conflict => create conflict node
-                self.conflict = [self.graph_assigns[i] for i in unsat]
-                return True
-            unused, used = self.formula.find_unit_clause()
-            if unused is not None:
-                # found a unit clause => simplify formula
-                self.formula.simplify(*unused)
-                causes = [self.graph_assigns[i] for i in used]
-                node = (*unused, d)
-                self.solution.append(node)
-                self.graph_assigns[unused[0]] = node
-                self.impl_graph.add_node(node)
-                for i in causes:
-                    self.impl_graph.connect(i, node)
-                loop = True
-        return False
+        # drop literals that are implied by the other literals of the learned clause
+        abstract = 0
+        for l in learned[1:]:
+            abstract |= 1 << (level[l >> 1] & 31)
+        to_clear = learned[1:]
+        minimized = [learned[0]]
+        for l in learned[1:]:
+            if reason[l >> 1] == -1 or not self.redundant(l, abstract, to_clear):
+                minimized.append(l)
+        for l in to_clear:
+            seen[l >> 1] = 0
 
-    # computes a list of causes and maximum of their depths
-    def causes_of(self, node):
-        prevs = self.impl_graph.prev(node)
-        if len(prevs) == 0:
-            # the value was decided
-            return [(node[0], node[1], node[2])], node[2]
-        ret = []
-        max_depth = -1
-        for i in prevs:
-            if i[2] < node[2]:
-                # cause from lower depth
-                ret.append(i)
-                max_depth = max(max_depth, i[2])
-            else:
-                # cause from same depth => recurse
-                causes, rec_depth = self.causes_of(i)
-                ret.extend(causes)
-                max_depth = max(max_depth, rec_depth)
-        return ret, max_depth
-
-    def causes_of_conflict(self, d):
-        ret = []
-        max_depth = -1
-        for i in self.conflict:
-            if i[2] < d:
-                # cause from lower depth
-                ret.append(i)
-                max_depth = max(max_depth, i[2])
-            else:
-                # cause from same depth => recurse
-                causes, rec_depth = self.causes_of(i)
-                ret.extend(causes)
-                max_depth = max(max_depth, rec_depth)
-        # make the causes unique
-        return list(set(ret)), max_depth
-
-    # tries to resolve the problem on the current level,
-    # otherwise returns the level beta to backtrack
-    def diagnose(self, d):
-        induced, beta = self.causes_of_conflict(d)
-        if beta < d:
-            self.conflict = induced
-            return False, beta
-        self.formula.add_induced_clause(induced)
-        return True, None
+        # watch the literal from the highest level after the asserting one
+        beta = 0
+        if len(minimized) > 1:
+            top = max(range(1, len(minimized)), key=lambda i: level[minimized[i] >> 1])
+            minimized[1], minimized[top] = minimized[top], minimized[1]
+            beta = level[minimized[1] >> 1]
+        lbd = len(set(level[l >> 1] for l in minimized))
+        self.induced = self.formula.add_induced_clause(minimized, lbd)
+        if self.proof is not None:
+            self.proof.add(minimized)
+        return beta, lbd
+
+    # whether the false literal follows from the marked literals through the reasons,
+    # the variables visited on the way are marked and appended to to_clear
+    def redundant(self, literal: int, abstract: int, to_clear: list):
+        level, reason, seen = self.level, self.reason, self.seen
+        stack = [literal]
+        top = len(to_clear)
+        while len(stack) > 0:
+            var = stack.pop() >> 1
+            for l in self.formula.explanation(reason[var], var):
+                v = l >> 1
+                if v != var and not seen[v] and level[v] > 0:
+                    if reason[v] != -1 and (1 << (level[v] & 31)) & abstract:
+                        seen[v] = 1
+                        stack.append(l)
+                        to_clear.append(l)
+                    else:
+                        for c in to_clear[top:]:
+                            seen[c >> 1] = 0
+                        del to_clear[top:]
+                        return False
+        return True
+
+    # the assumptions that imply the negation of the false assumption, together with it
+    def analyze_final(self, literal: int):
+        core = [literal]
+        if len(self.trail_lim) == 0:
+            return core
+        seen = self.seen
+        seen[literal >> 1] = 1
+        for l in reversed(self.trail[self.trail_lim[0]:]):
+            var = l >> 1
+            if seen[var]:
+                if self.reason[var] == -1:
+                    # only assumptions are decided so far
+                    core.append(l)
+                else:
+                    for r in self.formula.explanation(self.reason[var], var):
+                        if self.level[r >> 1] > 0:
+                            seen[r >> 1] = 1
+                seen[var] = 0
+        seen[literal >> 1] = 0
+        return core
+
+    # assert the first literal of the induced clause on the current level
+    def assert_induced(self):
+        literal = self.formula.clause(self.induced)[0]
+        self.enqueue(literal, self.induced)
+
+    # whether the clause is the reason of an assignment
+    def locked(self, ref: int):
+        literal = self.formula.clause(ref)[0]
+        return self.formula.values[literal] == 1 and self.reason[literal >> 1] == ref
 
+    # delete the worse half of the induced clauses, glue clauses (LBD <= 2) are kept
+    # unless the store takes more than max_learned_bytes
+    def reduce_learned(self):
+        learnts = self.formula.learnts
+        over_limit = self.max_learned_bytes is not None and learnts.nbytes() > self.max_learned_bytes
+        candidates = []
+        for i in range(len(learnts.clauses)):
+            ref = learned_ref(i)
+            if not learnts.deleted[i] and (learnts.lbd[i] > 2 or over_limit) and not self.locked(ref):
+                candidates.append(ref)
+        # worst first: high LBD, then low activity
+        candidates.sort(key=lambda ref: (-learnts.lbd[learned_ref(ref)], learnts.activity[learned_ref(ref)]))
+        for ref in candidates[:len(candidates)//2]:
+            learnts.delete(ref)
+            if self.proof is not None:
+                self.proof.delete(learnts.clauses[learned_ref(ref)])
+        self.collect_learned()
+        self.reductions += 1
+        self.next_reduce = self.conflicts + self.reduce_interval + self.reduce_increment*self.reductions
+
+    # remove the deleted clauses from the store and update the references to the moved ones
+    def collect_learned(self):
+        for watchers in self.formula.watches:
+            watchers[:] = [ref for ref in watchers if ref >= 0]
+        moved = self.formula.learnts.compact()
+        for l in self.trail:
+            if self.reason[l >> 1] < -1:
+                self.reason[l >> 1] = moved[self.reason[l >> 1]]
+        for ref in moved.values():
+            self.formula.watch(ref)
+
+    # undo all assignments from levels d and above
     def erase(self, d: int):
-        for i in reversed(self.solution):
-            if i[2] < d:
-                return
-            self.solution.pop()
-            del self.graph_assigns[i[0]]
-            self.impl_graph.delete_node(i)
-            self.formula.undo(i[0])
+        if d > len(self.trail_lim):
+            return
+        start = self.trail_lim[d-1]
+        if len(self.formula.cards) > 0:
+            for l in self.trail[start:self.propagated]:
+                self.formula.uncount(l)
+        for l in self.trail[start:]:
+            self.formula.unassign(l >> 1)
+            self.reason[l >> 1] = -1
+            self.phase[l >> 1] = not l & 1
+            self.order.push(l >> 1)
+        del self.trail[start:]
+        del self.trail_lim[d-1:]
+        self.propagated = min(self.propagated, start)
 
 
-def write_output(file, solution):
+def write_output(file, solution, status: str = None):
+    # 0 for an unsatisfiable formula, UNKNOWN if the solver gave up
     f = open(file, 'w')
-    if solution is None:
+    if status == "UNKNOWN":
+        f.write('UNKNOWN')
+    elif solution is None:
         f.write('0')
     else:
         for (var, val) in solution:
@@ -417,36 +1107,235 @@ def hexRepresentation(solution):
 
 
 def check(formula, solution):
-    for idx, val in solution:
-        formula.simplify(idx, val)
-    if len(formula.unsat_clauses) == 0:
-        return True
-    return False
+    return verify(formula.clauses, solution)[0]
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print("Usage: " + sys.argv[0] + " <input file> <output file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="CDCL SAT solver")
+    parser.add_argument("input", help="input file in DIMACS format")
+    parser.add_argument("output", help="output file for the solution")
+    parser.add_argument("--restarts", choices=sorted(RESTARTS), default="luby",
+                        help="restart policy (default: luby)")
+    parser.add_argument("--branching", choices=BRANCHING, default="evsids",
+                        help="decision heuristic (default: evsids)")
+    parser.add_argument("--reduce-interval", type=int, default=2000,
+                        help="conflicts before the first reduction of learned clauses (default: 2000)")
+    parser.add_argument("--reduce-increment", type=int, default=300,
+                        help="growth of the interval after every reduction (default: 300)")
+    parser.add_argument("--max-learned-mb", type=float, default=None,
+                        help="memory limit for learned clauses in MB, reached => reduce (default: none)")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="simplify the formula with subsumption and variable elimination first")
+    parser.add_argument("--amo", action="store_true",
+                        help="replace pairwise at-most-one clauses with native at-most-one constraints")
+    parser.add_argument("--inprocess", action="store_true",
+                        help="probe failed literals and substitute equivalent literals before the search and "
+                             "between restarts")
+    parser.add_argument("--inprocess-time", type=float, default=1.0, metavar="SECONDS",
+                        help="time limit of the probing in every round of --inprocess (default: 1)")
+    parser.add_argument("--inprocess-interval", type=int, default=5000, metavar="N",
+                        help="conflicts between the rounds of --inprocess (default: 5000)")
+    parser.add_argument("--initial-phase", choices=PHASES, default="false",
+                        help="value of variables before they are assigned for the first time (default: false)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the initial variable order")
+    parser.add_argument("--local-search", type=float, metavar="SECONDS",
+                        help="try local search first, CDCL starts from the phases of its best assignment")
+    parser.add_argument("--local-search-algorithm", choices=ALGORITHMS, default="probsat",
+                        help="algorithm of --local-search (default: probsat)")
+    parser.add_argument("--portfolio", type=int, default=0, metavar="N",
+                        help="run N diversified solvers in parallel processes, the first answer wins")
+    parser.add_argument("--no-sharing", action="store_true",
+                        help="do not share induced clauses between the processes of the portfolio")
+    parser.add_argument("--stats", metavar="FILE", help="write statistics of the search as JSON at exit")
+    parser.add_argument("--progress", type=float, metavar="SECONDS",
+                        help="print a progress line to stderr every SECONDS")
+    parser.add_argument("--profile", metavar="FILE", help="profile the search with cProfile, pstats output")
+    parser.add_argument("--time-limit", type=float, metavar="SECONDS", help="give up after SECONDS of search")
+    parser.add_argument("--conflicts", type=int, metavar="N", help="give up after N conflicts")
+    parser.add_argument("--propagations", type=int, metavar="N", help="give up after N propagated literals")
+    parser.add_argument("--memory-limit", type=float, metavar="MB",
+                        help="give up when the process has used MB of memory")
+    parser.add_argument("--proof", metavar="FILE", help="write a DRAT proof of unsatisfiability (file or pipe)")
+    parser.add_argument("--proof-format", choices=["binary", "text"], default="binary",
+                        help="format of the DRAT proof (default: binary)")
+    parser.add_argument("--enumerate", type=int, metavar="N",
+                        help="write up to N models (0 for all of them) to the output file, one per line")
+    parser.add_argument("--project", metavar="VARS",
+                        help="enumerate only the values of these variables, e.g. 1-81,100")
+    parser.add_argument("--unique", action="store_true", help="check whether the formula has exactly one model")
+    parser.add_argument("--cache", metavar="FILE", help="look up and store the result in this cache (see cache.py)")
+    parser.add_argument("--cache-renaming", action="store_true",
+                        help="also find formulas that differ only in the numbering of the variables")
+    parser.add_argument("--cache-max-mb", type=float, default=None, metavar="MB",
+                        help="evict the least recently used results above MB")
+    parser.add_argument("--cache-max-age", type=float, default=None, metavar="SECONDS",
+                        help="evict results that were not used for SECONDS")
+    args = parser.parse_args()
+    if args.proof is not None and (args.preprocess or args.portfolio > 0):
+        parser.error("--proof cannot be combined with --preprocess or --portfolio")
+    if args.proof is not None and args.cache is not None:
+        # a cache hit is answered without a search, so there would be no proof
+        parser.error("--proof cannot be combined with --cache")
+    if args.unique:
+        args.enumerate = 2
+    if args.proof is not None and args.enumerate is not None:
+        # the blocking clauses are not in the proof, the final empty clause would not follow from the formula
+        parser.error("--proof cannot be combined with --enumerate or --unique")
+    if args.enumerate is not None and (args.preprocess or args.portfolio > 0):
+        parser.error("--enumerate and --unique cannot be combined with --preprocess or --portfolio")
+    projection = None
+    if args.project is not None:
+        projection = []
+        for part in args.project.split(","):
+            first, _, last = part.partition("-")
+            projection.extend(range(int(first), int(last or first) + 1))
+    budgets = {"time_limit": args.time_limit, "conflicts": args.conflicts, "propagations": args.propagations,
+               "memory_mb": args.memory_limit}
+    if args.portfolio > 0 and any(budget is not None for budget in budgets.values()):
+        parser.error("budgets are not supported with --portfolio")
+    if args.portfolio > 0 and args.inprocess:
+        parser.error("--inprocess cannot be combined with --portfolio")
+    if args.portfolio > 0 and args.amo:
+        parser.error("--amo cannot be combined with --portfolio")
+    if args.portfolio > 0 and (args.stats is not None or args.profile is not None):
+        parser.error("--stats and --profile cannot be combined with --portfolio")
     verbose = True
     if verbose:
         print("Reading...")
-    formula = Formula(sys.argv[1])
+    dimacs = DimacsParser(args.input)
+    clauses = dimacs.parse()
+    if verbose:
+        for warning in dimacs.warnings:
+            print("Warning:", warning)
+        print(f"Read {len(clauses)} clauses in {dimacs.seconds:.3f} s ({dimacs.throughput():.1f} MB/s)")
+    original = clauses
+    cache = None
+    if args.cache is not None and args.enumerate is None:
+        cache = ResultCache(args.cache, None if args.cache_max_mb is None else int(args.cache_max_mb*2**20),
+                            args.cache_max_age)
+        key = formula_key(original, args.cache_renaming)
+        hit = cache.get(key, original)
+        if hit is not None:
+            # the model was verified by the cache
+            status, s = hit
+            print(f"Cache hit: {status}")
+            write_output(args.output, s, status)
+            cache.close()
+            sys.exit(0)
+        if verbose:
+            print("Cache miss")
+    preprocessor = None
+    if args.preprocess:
+        if verbose:
+            print("Preprocessing...")
+        preprocessor = Preprocessor(clauses)
+        clauses = preprocessor.run()
+        if verbose:
+            print(preprocessor.report())
     #formula = Formula("tests/izraz.txt")
     if verbose:
         print("Solving...")
     start = time()
-    solver = CDCL(formula)
-    s = solver.solve()
+    status, stopped = None, None
+    search = None
+    stats = None
+    if args.stats is not None or args.progress is not None:
+        stats = Stats(args.progress)
+    if args.local_search is not None and args.enumerate is None:
+        search = LocalSearch(clauses, seed=args.seed)
+        s = search.solve(args.local_search_algorithm, time_limit=args.local_search)
+        if verbose:
+            print(f"Local search: {search.flips} flips, {search.best_false} clauses false at best")
+    if search is not None and s is not None:
+        status = "SAT"
+        if args.stats is not None:
+            # the model was found without CDCL, only the counters of the local search
+            stats.dump(args.stats, local_search_flips=search.flips)
+    elif args.portfolio > 0:
+        from portfolio import solve_portfolio
+        s = solve_portfolio(clauses, args.portfolio, share=not args.no_sharing, verbose=verbose)
+    else:
+        groups = []
+        if args.amo:
+            groups, rest = find_at_most_one(clauses)
+            if verbose:
+                print(f"{len(groups)} at-most-one constraints replace {len(clauses) - len(rest)} clauses")
+            formula = Formula(rest)
+        else:
+            formula = Formula(clauses)
+        max_learned_bytes = None if args.max_learned_mb is None else int(args.max_learned_mb*2**20)
+        solver = CDCL(formula, restarts=args.restarts, branching=args.branching,
+                      reduce_interval=args.reduce_interval, reduce_increment=args.reduce_increment,
+                      max_learned_bytes=max_learned_bytes, initial_phase=args.initial_phase, seed=args.seed,
+                      stats=stats)
+        for group in groups:
+            solver.add_at_most_one(group)
+        if args.profile is not None:
+            solver.hooks.append(ProfileHook(args.profile))
+        if args.proof is not None:
+            solver.proof = ProofWriter(args.proof, binary=args.proof_format == "binary")
+        if args.inprocess:
+            from inprocess import Inprocessor
+            solver.inprocessor = Inprocessor(args.inprocess_time, args.inprocess_interval)
+        if search is not None:
+            # continue from the assignment closest to a model
+            for var in range(1, clauses.num_of_vars+1):
+                solver.phase[var] = search.best[var]
+        # Ctrl-C and kill stop the search cleanly with UNKNOWN
+        signal.signal(signal.SIGINT, lambda signum, frame: solver.interrupt())
+        signal.signal(signal.SIGTERM, lambda signum, frame: solver.interrupt())
+        try:
+            if args.enumerate is not None:
+                # models are written as soon as they are found
+                count = 0
+                with open(args.output, "w") as out:
+                    for model in solver.models(projection, args.enumerate or None, **budgets):
+                        count += 1
+                        out.write(" ".join(str(var if val else -var) for var, val in model) + "\n")
+                        out.flush()
+                        if verbose:
+                            print(f"model {count} after {time() - start:.3f} s")
+                status, stopped = solver.status, solver.stopped
+                print('time', time() - start)
+                if status == "UNKNOWN":
+                    print(f"UNKNOWN (stopped by {stopped}) after {count} models")
+                elif args.unique:
+                    print(["no model", "unique model", "more than one model"][count])
+                else:
+                    print(f"{count} models" + (" (all of them)" if status == "UNSAT" else ""))
+                sys.exit(0)
+            status, s, stopped = solver.solve_limited(**budgets)
+        finally:
+            if verbose and solver.inprocessor is not None:
+                print("Inprocessing:", solver.inprocessor.report())
+            if args.stats is not None:
+                counters = solver.counters()
+                if search is not None:
+                    counters["local_search_flips"] = search.flips
+                stats.dump(args.stats, **counters)
+            if solver.proof is not None:
+                solver.proof.close()
+    if s is not None and preprocessor is not None:
+        s = preprocessor.extend_model(s)
     end = time()
     print('time', end-start)
+    if status == "UNKNOWN":
+        print(f"UNKNOWN (stopped by {stopped})")
     if verbose:
         print("Printing...")
     #prettyPrintResult(s)
     #print(hexRepresentation(s))
     #print(hexRepresentation(readSolution(sys.argv[2])))
-    print(check(Formula(sys.argv[1]), s))
-    write_output(sys.argv[2], s)
+    if s is not None:
+        ok, falsified, _ = verify(original, s)
+        print(ok if ok else f"False: clause {falsified} is falsified")
+    if cache is not None:
+        if s is not None and ok:
+            cache.put(key, "SAT", s)
+        elif s is None and status != "UNKNOWN":
+            cache.put(key, "UNSAT")
+        cache.close()
+    write_output(args.output, s, status)
 
     '''
     # sudoku print
@@ -0,0 +1,216 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import sys
+from multiprocessing.connection import wait
+from time import time, process_time
+from cache import ResultCache, formula_key
+from dimacs import read_dimacs, read_dimacs_text
+from preprocess import Preprocessor
+from verify import verify
+import SAT_solver
+import SAT_solver_CDCL
+
+INPUT_PATTERNS = ["*.cnf", "*.cnf.gz", "*.cnf.xz", "*.cnf.bz2", "*.bcnf"]
+MIN_MEMORY_LIMIT = 16  # MB, below that even reading a tiny formula fails
+
+
+def collect_inputs(inputs: list, manifest: str = None):
+    # files, glob patterns and directories (all CNF files inside) and the lines of the manifest
+    paths = []
+    if manifest is not None:
+        with open(manifest, "r") as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    inputs.append(line)
+    for item in inputs:
+        if os.path.isdir(item):
+            found = set()
+            for pattern in INPUT_PATTERNS:
+                found.update(glob.glob(os.path.join(item, "**", pattern), recursive=True))
+            paths.extend(sorted(found))
+        elif os.path.exists(item):
+            paths.append(item)
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+            if len(matches) == 0:
+                print(f"Warning: {item} does not match any file", file=sys.stderr)
+            paths.extend(matches)
+    return list(dict.fromkeys(paths))
+
+
+def solve_instance(path: str, solver: str = "cdcl", preprocess: bool = False, models: str = None,
+                   cache: str = None, data: bytes = None):
+    # solve one file (or the DIMACS text data, path is its name) in the worker process, returns the result
+    # without times
+    clauses = read_dimacs(path) if data is None else read_dimacs_text(data, path)
+    original = clauses
+    if cache is not None:
+        # all workers share the cache, a hit is returned without solving
+        cache = ResultCache(cache)
+        key = formula_key(original)
+        start = time()
+        hit = cache.get(key, original)
+        if hit is not None:
+            result = {"status": hit[0], "time": time() - start, "counters": dict(), "cached": True}
+            if hit[1] is not None:
+                result["verified"] = True  # checked by the cache
+            return model_result(path, result, hit[1], models)
+    preprocessor = None
+    if preprocess:
+        preprocessor = Preprocessor(clauses)
+        clauses = preprocessor.run()
+    counters = dict()
+    start = time()
+    if solver == "dpll":
+        s = SAT_solver.dpll(SAT_solver.from_arena(clauses))
+    else:
+        cdcl = SAT_solver_CDCL.CDCL(SAT_solver_CDCL.Formula(clauses))
+        s = cdcl.solve()
+        counters = {"conflicts": cdcl.conflicts, "restarts": cdcl.restarts, "reductions": cdcl.reductions,
+                    "learned": len(cdcl.formula.learnts)}
+    if s is not None and preprocessor is not None:
+        s = preprocessor.extend_model(s)
+    # time of the search alone, like the time printed by the solvers
+    result = {"status": "UNSAT" if s is None else "SAT", "time": time() - start, "counters": counters}
+    if s is not None:
+        # every clause of the original formula has to be satisfied
+        result["verified"] = verify(original, s)[0]
+    if cache is not None and (s is None or result["verified"]):
+        cache.put(key, result["status"], s)
+    return model_result(path, result, s, models)
+
+
+def model_result(path: str, result: dict, s, models: str = None):
+    # the model goes into the result or into a file in the models directory
+    if s is not None:
+        if models is not None:
+            result["model_path"] = os.path.join(models, os.path.basename(path) + ".out")
+            SAT_solver_CDCL.write_output(result["model_path"], s)
+        else:
+            result["model"] = [var if val else -var for var, val in sorted(s)]
+    return result
+
+
+def address_space():
+    # virtual memory of this process in bytes (VmSize), 0 without /proc
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def set_memory_limit(memory_limit: float):
+    # RLIMIT_AS limits the address space, which already holds Python and NumPy (about 100 MB) when the
+    # worker is forked, so the instance gets memory_limit MB on top of the address space at this point
+    if memory_limit is not None:
+        limit = address_space() + int(memory_limit * 2**20)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def solve_safely(path: str, options: dict):
+    # solve_instance with the errors as results, the CPU time and the peak memory of the process
+    start = process_time()
+    try:
+        result = solve_instance(path, **options)
+    except MemoryError:
+        result = {"status": "MEMOUT"}
+    except RecursionError:
+        result = {"status": "ERROR", "error": "recursion limit exceeded"}
+    except Exception as e:
+        result = {"status": "ERROR", "error": f"{type(e).__name__}: {e}"}
+    result["cpu"] = process_time() - start
+    result["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def worker(conn, path: str, memory_limit: float, options: dict):
+    # runs in a forked process, so the solver modules are already loaded
+    set_memory_limit(memory_limit)
+    conn.send(solve_safely(path, options))
+    conn.close()
+
+
+def run_batch(paths: list, jobs: int = 1, time_limit: float = None, memory_limit: float = None, **options):
+    # solve the files on jobs processes, yields the result of every file in the order of completion;
+    # options are passed to solve_instance
+    context = multiprocessing.get_context("fork")
+    pending = list(reversed(paths))
+    running = dict()  # {connection: (path, process, start)}
+    while len(pending) > 0 or len(running) > 0:
+        while len(pending) > 0 and len(running) < jobs:
+            path = pending.pop()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=worker, args=(sender, path, memory_limit, options), daemon=True)
+            process.start()
+            sender.close()
+            running[receiver] = (path, process, time())
+        timeout = None
+        if time_limit is not None:
+            timeout = max(0.0, min(start for _, _, start in running.values()) + time_limit - time())
+        ready = wait(list(running), timeout=timeout)
+        now = time()
+        for receiver in list(running):
+            path, process, start = running[receiver]
+            if receiver in ready:
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    # the process died without an answer
+                    process.join()
+                    result = {"status": "ERROR", "error": f"worker exited with code {process.exitcode}", "cpu": None}
+            elif time_limit is not None and now - start >= time_limit:
+                process.kill()
+                result = {"status": "TIMEOUT", "cpu": None}
+            else:
+                continue
+            process.join()
+            receiver.close()
+            del running[receiver]
+            line = {"instance": path, "status": result.pop("status"), "wall": now - start}
+            line.update(result)
+            yield line
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="solve many DIMACS files, one JSON line per file")
+    parser.add_argument("inputs", nargs="*", help="files, glob patterns or directories")
+    parser.add_argument("--manifest", help="file with one input per line")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--solver", choices=["cdcl", "dpll"], default="cdcl")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="simplify the formulas with subsumption and variable elimination first")
+    parser.add_argument("--time-limit", type=float, default=None, help="wall time limit per instance in seconds")
+    parser.add_argument("--memory-limit", type=float, default=None,
+                        help="memory an instance may allocate in MB (address space on top of the worker)")
+    parser.add_argument("--models", help="directory for the models, otherwise they are included in the results")
+    parser.add_argument("--cache", metavar="FILE", help="result cache shared by the workers (see cache.py)")
+    parser.add_argument("-o", "--output", help="file for the results (default: standard output)")
+    args = parser.parse_args()
+    if args.memory_limit is not None and args.memory_limit < MIN_MEMORY_LIMIT:
+        parser.error(f"--memory-limit has to be at least {MIN_MEMORY_LIMIT} MB")
+    paths = collect_inputs(args.inputs, args.manifest)
+    if len(paths) == 0:
+        parser.error("no input files")
+    if args.models is not None:
+        os.makedirs(args.models, exist_ok=True)
+    out = sys.stdout if args.output is None else open(args.output, "w")
+    start = time()
+    counts = dict()
+    for line in run_batch(paths, args.jobs, args.time_limit, args.memory_limit, solver=args.solver,
+                          preprocess=args.preprocess, models=args.models, cache=args.cache):
+        out.write(json.dumps(line) + "\n")
+        out.flush()
+        counts[line["status"]] = counts.get(line["status"], 0) + 1
+    if out is not sys.stdout:
+        out.close()
+    print(f"{len(paths)} instances in {time() - start:.2f} s: " +
+          ", ".join(f"{count} {status}" for status, count in sorted(counts.items())), file=sys.stderr)
@@ -0,0 +1,155 @@
+import argparse
+import glob
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from batch import run_batch
+
+BASELINE_VERSION = 1
+SUITES = {
+    "random": ["tests/random/test*.txt", "tests/random/rand*.txt", "tests/random/unsat*.txt"],
+    "aim": ["tests/SATLIB/aim/*.cnf"],
+    "k3": ["tests/SATLIB/k3_n100_m403_b10/*.cnf"],
+    "large": ["tests/large/*.txt"],
+    "sudoku": ["tests/sudoku_mini.txt", "tests/sudoku_easy.txt", "tests/sudoku_hard.txt"],
+    "queens": ["tests/random/queen*.txt"],
+}
+
+
+def suite_files(names: list):
+    # {instance: suite}
+    ret = dict()
+    for name in names:
+        for pattern in SUITES[name]:
+            for path in sorted(glob.glob(pattern)):
+                ret[path] = name
+    return ret
+
+
+def benchmark(files: dict, solvers: list, repeat: int, time_limit: float, memory_limit: float = None):
+    # runs every instance repeat times with every solver, one at a time so that the times are comparable;
+    # returns {solver: {instance: summary}}
+    results = dict()
+    for solver in solvers:
+        results[solver] = dict()
+        for path, suite in files.items():
+            runs = []
+            for _ in range(repeat):
+                runs.extend(run_batch([path], 1, time_limit, memory_limit, solver=solver))
+                if runs[-1]["status"] not in ("SAT", "UNSAT"):
+                    break  # a timeout would only repeat itself
+            solved = [r for r in runs if r["status"] in ("SAT", "UNSAT")]
+            times = [r["time"] for r in solved]
+            summary = {"suite": suite, "status": runs[-1]["status"], "runs": len(runs)}
+            if len(solved) == len(runs):
+                summary.update({"median": statistics.median(times), "min": min(times), "max": max(times),
+                                "peak_rss": max(r["peak_rss"] for r in runs), "counters": solved[0]["counters"]})
+            print(f"{solver:5s} {path:70s} {summary['status']:7s} " +
+                  (f"{summary['median']:8.3f} s [{summary['min']:.3f}, {summary['max']:.3f}]"
+                   if "median" in summary else ""), file=sys.stderr)
+            results[solver][path] = summary
+    return results
+
+
+def solved_time(summary: dict):
+    if summary["status"] in ("SAT", "UNSAT"):
+        return summary["median"]
+    return None
+
+
+def par2(results: dict, time_limit: float):
+    # penalized average runtime, unsolved instances count twice the time limit
+    times = [solved_time(s) for s in results.values()]
+    return sum(2*time_limit if t is None else t for t in times) / max(len(times), 1)
+
+
+def report(results: dict, time_limit: float):
+    for solver, instances in results.items():
+        suites = dict()
+        for path, summary in instances.items():
+            suites.setdefault(summary["suite"], dict())[path] = summary
+        print(f"{solver}: PAR-2 {par2(instances, time_limit):.3f} s over {len(instances)} instances")
+        for suite, summaries in suites.items():
+            solved = sum(solved_time(s) is not None for s in summaries.values())
+            print(f"  {suite:8s} solved {solved}/{len(summaries)}, PAR-2 {par2(summaries, time_limit):.3f} s")
+
+
+def cactus(results: dict, path: str):
+    # solver, number of solved instances and the time of the last one, sorted by time
+    with open(path, "w") as file:
+        file.write("solver,solved,time\n")
+        for solver, instances in results.items():
+            times = sorted(t for t in map(solved_time, instances.values()) if t is not None)
+            for i, t in enumerate(times):
+                file.write(f"{solver},{i+1},{t:.6f}\n")
+
+
+def compare(baseline: dict, results: dict, threshold: float, min_time: float):
+    # instances that got slower by more than threshold (relative) and min_time (seconds),
+    # or that are not solved any more; returns the lines of the diff
+    diff = []
+    for solver, instances in results.items():
+        for path, summary in instances.items():
+            old = baseline["results"].get(solver, dict()).get(path)
+            if old is None:
+                continue
+            before, after = solved_time(old), solved_time(summary)
+            if before is not None and after is None:
+                diff.append(f"{solver} {path}: {old['status']} in {before:.3f} s -> {summary['status']}")
+            elif before is not None and after > before*(1 + threshold) and after - before > min_time:
+                diff.append(f"{solver} {path}: {before:.3f} s -> {after:.3f} s (+{(after/before - 1)*100:.0f}%)")
+            elif before is not None and old["status"] != summary["status"]:
+                diff.append(f"{solver} {path}: {old['status']} -> {summary['status']}")
+    return diff
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="benchmark the solvers on the tests/ corpus")
+    parser.add_argument("--suites", default="random,aim,k3,sudoku,queens",
+                        help=f"comma separated suites from {', '.join(SUITES)} (default: all but large)")
+    parser.add_argument("--solvers", default="cdcl", help="comma separated solvers: cdcl, dpll (default: cdcl)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every instance (default: 3)")
+    parser.add_argument("--time-limit", type=float, default=60, help="time limit per run in seconds (default: 60)")
+    parser.add_argument("--memory-limit", type=float, default=None, help="memory limit per run in MB")
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline to compare with, regressions => exit code 1")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown that counts as a regression (default: 0.25)")
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="slowdowns smaller than this many seconds are ignored (default: 0.05)")
+    parser.add_argument("--cactus", help="write cactus plot data (CSV) to this file")
+    args = parser.parse_args()
+
+    files = suite_files(args.suites.split(","))
+    results = benchmark(files, args.solvers.split(","), args.repeat, args.time_limit, args.memory_limit)
+    report(results, args.time_limit)
+    if args.cactus is not None:
+        cactus(results, args.cactus)
+    if args.save is not None:
+        with open(args.save, "w") as file:
+            json.dump({"version": BASELINE_VERSION, "created": datetime.now(timezone.utc).isoformat(),
+                       "revision": git_revision(), "python": platform.python_version(),
+                       "machine": platform.machine(), "time_limit": args.time_limit, "repeat": args.repeat,
+                       "results": results}, file, indent=1)
+    if args.compare is not None:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)
+        if baseline.get("version") != BASELINE_VERSION:
+            sys.exit(f"{args.compare}: baseline version {baseline.get('version')}, expected {BASELINE_VERSION}")
+        diff = compare(baseline, results, args.threshold, args.min_time)
+        if len(diff) > 0:
+            print(f"{len(diff)} regressions against {args.compare} (revision {baseline.get('revision')}):")
+            for line in diff:
+                print("  " + line)
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
@@ -0,0 +1,166 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from time import perf_counter
+from cnf import ClauseArena
+
+# Binary formula format (.bcnf): a header of 32 bytes, "BCNF", the version (uint32), the number of variables,
+# clauses and literals (int64), all little-endian, then the arrays of a ClauseArena as int32: the literals
+# (encoded as in cnf.py), the start of every clause in the literals and the size of every clause.
+MAGIC = b"BCNF"
+VERSION = 1
+HEADER = struct.Struct("<4sIqqq")
+
+
+class BinaryFormatError(ValueError):
+    pass
+
+
+def is_binary(src_path: str):
+    with open(src_path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def write_binary(arena: ClauseArena, path: str):
+    if sys.byteorder != "little":
+        raise BinaryFormatError("the binary format is little-endian")
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, arena.num_of_vars, len(arena.starts), len(arena.lits)))
+        for a in (arena.lits, arena.starts, arena.sizes):
+            file.write(a)
+
+
+class MappedArena(ClauseArena):
+    # ClauseArena on a binary file mapped into memory: lits, starts and sizes are memoryviews of a private
+    # (copy-on-write) mapping, so opening the file reads nothing and processes that map the same file share
+    # its pages until they write to them (the CDCL solver reorders the literals of clauses it watches).
+    # Adding a clause copies the arrays into the memory of the process first.
+    def __init__(self, path: str):
+        super().__init__()
+        if sys.byteorder != "little":
+            raise BinaryFormatError("the binary format is little-endian")
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < HEADER.size:
+                raise BinaryFormatError(f"{path}: too short for a binary formula")
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, num_of_vars, num_of_clauses, num_of_lits = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC:
+            raise BinaryFormatError(f"{path}: not a binary formula")
+        if version != VERSION:
+            raise BinaryFormatError(f"{path}: version {version} of the binary format, expected {VERSION}")
+        if size != HEADER.size + 4*(num_of_lits + 2*num_of_clauses):
+            raise BinaryFormatError(f"{path}: {size} bytes, expected {HEADER.size + 4*(num_of_lits + 2*num_of_clauses)}")
+        self.num_of_vars = num_of_vars
+        view = memoryview(self.mmap)
+        offset = HEADER.size
+        arrays = []
+        for n in (num_of_lits, num_of_clauses, num_of_clauses):
+            arrays.append(view[offset:offset + 4*n].cast('i'))
+            offset += 4*n
+        self.lits, self.starts, self.sizes = arrays
+
+    def materialize(self):
+        # copy the arrays from the mapping, so that they can grow
+        if isinstance(self.lits, memoryview):
+            for name in ("lits", "starts", "sizes"):
+                copy = array('i')
+                copy.frombytes(getattr(self, name).cast('B'))
+                setattr(self, name, copy)
+
+    def add_clause(self, literals):
+        self.materialize()
+        return super().add_clause(literals)
+
+    def add_clauses(self, lits: array, sizes: array):
+        self.materialize()
+        super().add_clauses(lits, sizes)
+
+
+def read_binary(src_path: str):
+    return MappedArena(src_path)
+
+
+def check_arena(arena: ClauseArena):
+    # the first inconsistency of the arrays or None; clauses have to follow each other in lits
+    n = len(arena.starts)
+    if len(arena.sizes) != n:
+        return f"{n} starts but {len(arena.sizes)} sizes"
+    position = 0
+    for i in range(n):
+        if arena.starts[i] != position or arena.sizes[i] < 0:
+            return f"clause {i} starts at {arena.starts[i]} with size {arena.sizes[i]}, expected start {position}"
+        position += arena.sizes[i]
+    if position != len(arena.lits):
+        return f"the clauses have {position} literals, lits has {len(arena.lits)}"
+    for l in arena.lits:
+        if l < 2 or l >> 1 > arena.num_of_vars:
+            return f"literal {l} is not a literal of {arena.num_of_vars} variables"
+    return None
+
+
+def round_trip(src_path: str):
+    # converts the DIMACS file to the binary format and back, returns the first difference or None
+    from dimacs import read_dimacs
+    arena = read_dimacs(src_path)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "formula.bcnf")
+        write_binary(arena, path)
+        mapped = read_binary(path)
+        if mapped.num_of_vars != arena.num_of_vars:
+            return f"{mapped.num_of_vars} variables instead of {arena.num_of_vars}"
+        for name in ("lits", "starts", "sizes"):
+            if getattr(mapped, name).tolist() != getattr(arena, name).tolist():
+                return f"{name} differ"
+        problem = check_arena(mapped)
+        del mapped
+    return problem
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="binary formula format that is loaded with mmap")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert = subparsers.add_parser("convert", help="convert a DIMACS file to the binary format")
+    convert.add_argument("input", help="input file in DIMACS format")
+    convert.add_argument("output", help="binary formula")
+    check = subparsers.add_parser("check", help="check the structure of binary formulas")
+    check.add_argument("inputs", nargs="+", help="binary formulas")
+    trip = subparsers.add_parser("roundtrip", help="convert DIMACS files to the binary format and compare")
+    trip.add_argument("inputs", nargs="+", help="DIMACS files, glob patterns or directories")
+    args = parser.parse_args()
+    if args.command == "convert":
+        from dimacs import read_dimacs
+        start = perf_counter()
+        arena = read_dimacs(args.input)
+        write_binary(arena, args.output)
+        print(f"{len(arena)} clauses, {len(arena.lits)} literals converted in {perf_counter() - start:.3f} s")
+    elif args.command == "check":
+        failed = 0
+        for path in args.inputs:
+            start = perf_counter()
+            try:
+                problem = check_arena(read_binary(path))
+            except BinaryFormatError as e:
+                problem = str(e)
+            failed += problem is not None
+            print(f"{path}: " + (problem or f"OK ({perf_counter() - start:.3f} s)"))
+        if failed > 0:
+            raise SystemExit(1)
+    else:
+        from batch import collect_inputs
+        from dimacs import DimacsError
+        failed = 0
+        for path in collect_inputs(args.inputs):
+            try:
+                problem = round_trip(path)
+            except DimacsError as e:
+                print(f"{path}: skipped, {e}")
+                continue
+            failed += problem is not None
+            print(f"{path}: " + (problem or "OK"))
+        if failed > 0:
+            raise SystemExit(1)
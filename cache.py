@@ -0,0 +1,210 @@
+import argparse
+import hashlib
+import sqlite3
+from array import array
+from time import time
+from cnf import ClauseArena
+from dimacs import read_dimacs
+from verify import verify
+
+
+def refine_colors(clauses: list, occurs: list, color: list, max_rounds: int = 20):
+    # Color refinement: in every round the new color of a variable is given by its old color and the
+    # colors of the clauses it occurs in (with the polarity), the color of a clause by the colors of its
+    # literals. Colors are ranks of sorted signatures, so they do not depend on the numbering of the
+    # variables. Stops when no color class is split any more.
+    n = len(color) - 1
+    classes = len(set(color))
+    for _ in range(max_rounds):
+        signatures = [tuple(sorted((color[l >> 1], l & 1) for l in c)) for c in clauses]
+        rank = {s: i for i, s in enumerate(sorted(set(signatures)))}
+        clause_color = [rank[s] for s in signatures]
+        signatures = [(color[v], tuple(sorted((clause_color[i], p) for i, p in occurs[v]))) for v in range(n+1)]
+        rank = {s: i for i, s in enumerate(sorted(set(signatures)))}
+        color = [rank[s] for s in signatures]
+        if len(rank) == classes:
+            break
+        classes = len(rank)
+    return color
+
+
+def canonical_order(arena: ClauseArena, clauses: list, max_individualized: int = 100):
+    # Variables in an order that (usually) does not depend on their numbering: color refinement, then while
+    # a color is shared by several variables, the one with the smallest number gets a color of its own and
+    # the colors are refined again. Variables of the same color are mostly symmetric, so it does not matter
+    # which one is picked. After max_individualized picks the remaining ties are broken by the numbers.
+    n = arena.num_of_vars
+    occurs = [[] for _ in range(n+1)]  # {variable: (clause, polarity)}
+    for i, c in enumerate(clauses):
+        for l in c:
+            occurs[l >> 1].append((i, l & 1))
+    color = refine_colors(clauses, occurs, [0]*(n+1))
+    for _ in range(max_individualized):
+        first = dict()
+        shared = set()
+        for v in range(1, n+1):
+            if color[v] in first:
+                shared.add(color[v])
+            else:
+                first[color[v]] = v
+        if len(shared) == 0:
+            break
+        picked = first[min(shared)]
+        color = [2*c + (v == picked) for v, c in enumerate(color)]
+        color = refine_colors(clauses, occurs, color)
+    return sorted(range(1, n+1), key=lambda v: (color[v], v))
+
+
+class CacheKey:
+    # digest of the canonical formula and the number of every variable in it
+    def __init__(self, digest: str, numbering: list):
+        self.digest = digest
+        self.numbering = numbering
+
+    def to_canonical(self, solution):
+        # model of the formula => signed variables of the canonical formula
+        return sorted(((self.numbering[var] if val else -self.numbering[var]) for var, val in solution), key=abs)
+
+    def from_canonical(self, numbers):
+        variables = [0]*len(self.numbering)
+        for var, number in enumerate(self.numbering):
+            variables[number] = var
+        return sorted((variables[abs(x)], x > 0) for x in numbers)
+
+
+def formula_key(arena: ClauseArena, renaming: bool = False):
+    # Hash of the formula that does not depend on the order of the clauses and of their literals, or on
+    # repeated literals and clauses. With renaming the variables are numbered in canonical_order first, so
+    # formulas that differ only in the numbering of the variables usually get the same key. Equal keys
+    # always mean equal formulas after the numbering.
+    n = arena.num_of_vars
+    clauses = [sorted(set(c)) for c in arena]
+    numbering = list(range(n+1))
+    if renaming:
+        for number, var in enumerate(canonical_order(arena, clauses)):
+            numbering[var] = number + 1
+        clauses = [sorted(2*numbering[l >> 1] + (l & 1) for l in c) for c in clauses]
+    canonical = array('i', [n])
+    for c in sorted(set(map(tuple, clauses))):
+        canonical.extend(c)
+        canonical.append(0)
+    return CacheKey(hashlib.sha256(canonical.tobytes()).hexdigest(), numbering)
+
+
+class ResultCache:
+    # Results (SAT with the model or UNSAT) of solved formulas in an SQLite database, shared by any number
+    # of processes. Entries are evicted by their last use: the ones not used for max_age seconds, and the
+    # least recently used ones while all models take more than max_bytes. Models of hits are checked with
+    # the verifier, a model that does not satisfy the formula is deleted and counts as a miss. The counters
+    # (hits, misses, stores, evictions, invalid) are kept in the database for all processes and in
+    # counters for this one.
+    def __init__(self, path: str, max_bytes: int = None, max_age: float = None):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalid": 0}
+        # autocommit, transactions are started explicitly
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                        "model BLOB, size INTEGER NOT NULL, created REAL NOT NULL, used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+        if n > 0:
+            self.db.execute("INSERT INTO counters VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + ?",
+                            (name, n, n))
+
+    def get(self, key: CacheKey, arena: ClauseArena):
+        # (status, model) or None
+        row = self.db.execute("SELECT status, model FROM results WHERE key = ?", (key.digest,)).fetchone()
+        if row is None:
+            self.count("misses")
+            return None
+        status, blob = row
+        model = None
+        if status == "SAT":
+            numbers = array('i')
+            numbers.frombytes(blob)
+            model = key.from_canonical(numbers)
+            if not verify(arena, model)[0]:
+                self.db.execute("DELETE FROM results WHERE key = ?", (key.digest,))
+                self.count("invalid")
+                self.count("misses")
+                return None
+        self.db.execute("UPDATE results SET used = ? WHERE key = ?", (time(), key.digest))
+        self.count("hits")
+        return status, model
+
+    def put(self, key: CacheKey, status: str, model=None):
+        blob = None if model is None else array('i', key.to_canonical(model)).tobytes()
+        size = len(key.digest) + (0 if blob is None else len(blob))
+        now = time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                            (key.digest, status, blob, size, now, now))
+            self.count("stores")
+            self.evict(now)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def evict(self, now: float = None):
+        now = time() if now is None else now
+        evicted = 0
+        if self.max_age is not None:
+            evicted += self.db.execute("DELETE FROM results WHERE used < ?", (now - self.max_age,)).rowcount
+        if self.max_bytes is not None:
+            # everything after the most recently used entries that fit into max_bytes
+            evicted += self.db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM (SELECT key, SUM(size) OVER "
+                "(ORDER BY used DESC, key ROWS UNBOUNDED PRECEDING) AS total FROM results) WHERE total > ?)",
+                (self.max_bytes,)).rowcount
+        self.count("evictions", evicted)
+        return evicted
+
+    def stats(self):
+        # counters of all processes, number of entries and their size
+        ret = dict(self.db.execute("SELECT name, value FROM counters").fetchall())
+        entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        ret.update({"entries": entries, "bytes": size})
+        return ret
+
+    def clear(self):
+        self.db.execute("DELETE FROM results")
+        self.db.execute("DELETE FROM counters")
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="result cache of the solvers")
+    parser.add_argument("cache", help="cache database")
+    parser.add_argument("command", choices=["stats", "evict", "clear", "key"])
+    parser.add_argument("input", nargs="?", help="input file in DIMACS format (for key)")
+    parser.add_argument("--renaming", action="store_true", help="key invariant to renaming of the variables")
+    parser.add_argument("--max-mb", type=float, default=None, help="size limit of the models in MB (for evict)")
+    parser.add_argument("--max-age", type=float, default=None, metavar="SECONDS",
+                        help="evict entries not used for SECONDS (for evict)")
+    args = parser.parse_args()
+    cache = ResultCache(args.cache, None if args.max_mb is None else int(args.max_mb*2**20), args.max_age)
+    if args.command == "stats":
+        for name, value in cache.stats().items():
+            print(f"{name}: {value}")
+    elif args.command == "evict":
+        print(f"{cache.evict()} entries evicted")
+    elif args.command == "clear":
+        cache.clear()
+    else:
+        if args.input is None:
+            parser.error("key needs an input file")
+        key = formula_key(read_dimacs(args.input), args.renaming)
+        print(key.digest)
+        row = cache.db.execute("SELECT status FROM results WHERE key = ?", (key.digest,)).fetchone()
+        print("cached: " + ("no" if row is None else row[0]))
+    cache.close()
@@ -0,0 +1,57 @@
+import argparse
+from time import perf_counter
+from cnf import ClauseArena, to_number
+from dimacs import read_dimacs
+
+
+def find_at_most_one(arena: ClauseArena, min_size: int = 3):
+    # Pairwise at-most-one groups: a binary clause (a ∨ b) says that at most one of ¬a and ¬b is true,
+    # so the binary clauses are edges of a graph on the negated literals and every clique of it is an
+    # at-most-one constraint. Cliques are grown greedily from the literals with the most edges, a new
+    # group has to cover a binary clause not covered yet. Returns the groups (lists of literals) and the
+    # formula without the binary clauses they replace; groups smaller than min_size are not worth it.
+    neighbours = dict()  # {literal: {literal: index of the binary clause}}
+    for i, c in enumerate(arena):
+        if len(c) != 2 or c[0] >> 1 == c[1] >> 1:
+            continue
+        a, b = c[0] ^ 1, c[1] ^ 1
+        neighbours.setdefault(a, dict()).setdefault(b, i)
+        neighbours.setdefault(b, dict()).setdefault(a, i)
+    degree = {l: len(n) for l, n in neighbours.items()}
+    replaced = set()
+    groups = []
+    for literal in sorted(neighbours, key=lambda l: -degree[l]):
+        edges = neighbours[literal]
+        if all(i in replaced for i in edges.values()):
+            continue
+        # neighbours over binary clauses that are not replaced yet first, the groups may overlap
+        group = [literal]
+        for other in sorted(edges, key=lambda l: (edges[l] in replaced, -degree[l])):
+            if all(l in neighbours[other] for l in group[1:]):
+                group.append(other)
+        covered = {neighbours[a][b] for i, a in enumerate(group) for b in group[i+1:]}
+        if len(group) >= min_size and not covered <= replaced:
+            groups.append(group)
+            replaced |= covered
+    rest = ClauseArena(arena.num_of_vars)
+    for i, c in enumerate(arena):
+        if i not in replaced:
+            rest.add_clause(c)
+    return groups, rest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="find pairwise at-most-one groups in a formula")
+    parser.add_argument("input", help="input file in DIMACS format")
+    parser.add_argument("--min-size", type=int, default=3, help="smallest group that is reported (default: 3)")
+    parser.add_argument("--list", action="store_true", help="print the groups")
+    args = parser.parse_args()
+    arena = read_dimacs(args.input)
+    start = perf_counter()
+    groups, rest = find_at_most_one(arena, args.min_size)
+    seconds = perf_counter() - start
+    print(f"{len(groups)} at-most-one groups with {sum(map(len, groups))} literals replace "
+          f"{len(arena) - len(rest)} of {len(arena)} clauses ({seconds:.3f} s)")
+    if args.list:
+        for group in groups:
+            print(" ".join(str(to_number(l)) for l in group))
@@ -0,0 +1,66 @@
+from array import array
+from itertools import accumulate, islice
+
+
+# Literals are encoded as integers: 2*v stands for the variable v and 2*v+1 for its negation,
+# so the negation of a literal l is l ^ 1 and its variable is l >> 1.
+def to_literal(number: int):
+    if number < 0:
+        return 2*(-number) + 1
+    return 2*number
+
+
+def to_number(literal: int):
+    if literal & 1:
+        return -(literal >> 1)
+    return literal >> 1
+
+
+# reference of the clauses explained by cardinality constraints (see Formula.explanation of the CDCL solver)
+CARDINALITY = 2**31 - 1
+
+
+class ClauseArena:
+    # all clauses are stored one after another in a single array of literals,
+    # clause i is lits[starts[i]:starts[i]+sizes[i]]
+    def __init__(self, num_of_vars: int = 0):
+        self.num_of_vars = num_of_vars
+        self.lits = array('i')
+        self.starts = array('i')
+        self.sizes = array('i')
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i: int):
+        start = self.starts[i]
+        return self.lits[start:start+self.sizes[i]]
+
+    def __iter__(self):
+        for i in range(len(self.starts)):
+            yield self[i]
+
+    def __str__(self):
+        return " ∧ ".join(f"({' ∨ '.join(str(to_number(l)) for l in c)})" for c in self)
+
+    def add_clause(self, literals):
+        # returns the index of the new clause
+        self.starts.append(len(self.lits))
+        self.sizes.append(len(literals))
+        self.lits.extend(literals)
+        if len(literals) > 0 and max(literals) >> 1 > self.num_of_vars:
+            self.num_of_vars = max(literals) >> 1
+        return len(self.starts) - 1
+
+    def add_clauses(self, lits: array, sizes: array):
+        # appends many clauses at once, the first sizes[0] literals form the first clause and so on
+        self.starts.extend(islice(accumulate(sizes, initial=len(self.lits)), len(sizes)))
+        self.sizes.extend(sizes)
+        self.lits.extend(lits)
+        if len(lits) > 0 and max(lits) >> 1 > self.num_of_vars:
+            self.num_of_vars = max(lits) >> 1
+
+    def nbytes(self):
+        return self.lits.itemsize*len(self.lits) + self.starts.itemsize*len(self.starts) + \
+            self.sizes.itemsize*len(self.sizes)
+
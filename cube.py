@@ -0,0 +1,244 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+from time import time
+from cnf import ClauseArena, to_literal, to_number
+from dimacs import read_dimacs
+from SAT_solver_CDCL import CDCL, Formula, write_output
+from verify import verify
+
+
+class Lookahead:
+    # Splits a formula into cubes (partial assignments) that together cover every solution.
+    # At every node of the split tree both values of the most promising variables are propagated,
+    # the variable that implies the most assignments on both sides (product of the counts, as in
+    # march) becomes the next split; a value that leads to a conflict is a failed literal and its
+    # negation is added to the cube, nodes where both values fail are refuted and dropped.
+    def __init__(self, arena: ClauseArena, max_candidates: int = 20):
+        self.solver = CDCL(Formula(arena), restarts="none")
+        self.max_candidates = max_candidates
+        self.occurrences = [0]*(arena.num_of_vars+1)
+        for c in arena:
+            for l in c:
+                self.occurrences[l >> 1] += 1
+        self.refuted = 0
+
+    def assume(self, literal: int):
+        # assign the literal on a new level and propagate, returns the number of assignments
+        # or None on a conflict
+        solver = self.solver
+        start = len(solver.trail)
+        solver.trail_lim.append(start)
+        solver.enqueue(literal, -1)
+        if solver.deduce() is not None:
+            return None
+        return len(solver.trail) - start
+
+    def retract(self):
+        self.solver.erase(len(self.solver.trail_lim))
+
+    def choose(self, cube: list):
+        # the split variable of the node, failed literals are assigned and added to the cube;
+        # returns the variable, 0 if every variable is assigned and None if the node is refuted
+        values = self.solver.formula.values
+        while True:
+            free = [v for v in range(1, len(self.occurrences)) if values[2*v] == 0]
+            if len(free) == 0:
+                return 0
+            free.sort(key=lambda v: -self.occurrences[v])
+            best, best_score = None, -1
+            for var in free[:self.max_candidates]:
+                if values[2*var] != 0:
+                    continue
+                counts = []
+                for literal in (2*var, 2*var+1):
+                    counts.append(self.assume(literal))
+                    self.retract()
+                if counts[0] is None and counts[1] is None:
+                    return None
+                if counts[0] is None or counts[1] is None:
+                    # failed literal, the other value is forced
+                    forced = 2*var + (counts[0] is None)
+                    cube.append(forced)
+                    if self.assume(forced) is None:
+                        return None
+                    break
+                score = counts[0]*counts[1] + counts[0] + counts[1]
+                if score > best_score:
+                    best, best_score = var, score
+            else:
+                return best
+
+    def split(self, depth: int):
+        # cubes of the formula as lists of literals, at most 2**depth of them
+        solver = self.solver
+        if not solver.enqueue_units() or solver.deduce() is not None:
+            return []
+        cubes = []
+        self.split_node([], depth, cubes)
+        return cubes
+
+    def split_node(self, cube: list, depth: int, cubes: list):
+        levels = len(self.solver.trail_lim)
+        var = self.choose(cube)
+        if var is None:
+            self.refuted += 1
+        elif var == 0 or depth == 0:
+            cubes.append(list(cube))
+        else:
+            for literal in (2*var, 2*var+1):
+                if self.assume(literal) is None:
+                    self.refuted += 1
+                else:
+                    self.split_node(cube + [literal], depth - 1, cubes)
+                self.retract()
+        # undo the failed literals assigned by choose
+        self.solver.erase(levels + 1)
+
+
+def write_icnf(path: str, arena: ClauseArena, cubes: list):
+    # the formula followed by one "a <literals> 0" line per cube
+    with open(path, "w") as file:
+        file.write("p inccnf\n")
+        for c in arena:
+            file.write(" ".join(str(to_number(l)) for l in c) + " 0\n")
+        for cube in cubes:
+            file.write("a " + " ".join(str(to_number(l)) for l in cube) + " 0\n")
+
+
+def read_icnf(path: str):
+    # returns the formula and the cubes
+    arena = ClauseArena()
+    cubes = []
+    numbers = []
+    with open(path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if len(line) == 0 or line[0] in "cp":
+                continue
+            if line[0] == "a":
+                cubes.append([to_literal(int(n)) for n in line[1:].split()[:-1]])
+                continue
+            for n in line.split():
+                if n == "0":
+                    arena.add_clause([to_literal(x) for x in numbers])
+                    numbers = []
+                else:
+                    numbers.append(int(n))
+    return arena, cubes
+
+
+def conquer_worker(arena: ClauseArena, cubes: list, directory: str, results):
+    # Solves the cubes that are not claimed yet, one incremental solver keeps its induced clauses
+    # from cube to cube. A cube is claimed by creating <i>.claim in the shared directory, so
+    # processes on several machines can work on the same cubes; the result of a cube is kept in
+    # <i>.result and a model in SAT, which stops the workers on the other machines before their next cube.
+    solver = CDCL(Formula(arena))
+    for i, cube in enumerate(cubes):
+        if os.path.exists(os.path.join(directory, "SAT")):
+            return
+        try:
+            os.close(os.open(os.path.join(directory, f"{i}.claim"), os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            continue
+        start = time()
+        s = solver.solve(cube)
+        seconds = time() - start
+        status = "UNSAT" if s is None else "SAT"
+        with open(os.path.join(directory, f"{i}.result"), "w") as file:
+            json.dump({"status": status, "time": seconds, "conflicts": solver.conflicts}, file)
+        if s is not None:
+            with open(os.path.join(directory, "SAT.tmp"), "w") as file:
+                json.dump([var if val else -var for var, val in s], file)
+            os.replace(os.path.join(directory, "SAT.tmp"), os.path.join(directory, "SAT"))
+        results.put((i, status, seconds, s))
+        if s is not None:
+            return
+
+
+def conquer(arena: ClauseArena, cubes: list, processes: int, directory: str = None, verbose: bool = False):
+    # solve the cubes on local processes, returns (status, solution) where status is SAT, UNSAT
+    # or UNKNOWN when cubes claimed on other machines are not finished yet
+    remove = directory is None
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="cubes")
+    os.makedirs(directory, exist_ok=True)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=conquer_worker, args=(arena, cubes, directory, results), daemon=True)
+               for _ in range(processes)]
+    solution = None
+    try:
+        for p in workers:
+            p.start()
+        while solution is None and (any(p.is_alive() for p in workers) or not results.empty()):
+            try:
+                i, status, seconds, s = results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if verbose:
+                print(f"cube {i} ({len(cubes[i])} literals): {status} in {seconds:.3f} s")
+            solution = s
+    finally:
+        for p in workers:
+            p.terminate()
+        for p in workers:
+            p.join()
+    status = "UNSAT"
+    if solution is not None or os.path.exists(os.path.join(directory, "SAT")):
+        status = "SAT"
+        if solution is None:
+            with open(os.path.join(directory, "SAT"), "r") as file:
+                solution = [(abs(n), n > 0) for n in json.load(file)]
+    else:
+        for i in range(len(cubes)):
+            if not os.path.exists(os.path.join(directory, f"{i}.result")):
+                status = "UNKNOWN"
+    if remove:
+        shutil.rmtree(directory)
+    return status, solution
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="cube and conquer: split a formula into cubes and solve them")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    split_parser = subparsers.add_parser("split", help="write the formula and its cubes in iCNF")
+    split_parser.add_argument("input", help="input file in DIMACS format")
+    split_parser.add_argument("cubes", help="output file in iCNF format")
+    conquer_parser = subparsers.add_parser("conquer", help="solve the cubes of an iCNF file")
+    conquer_parser.add_argument("cubes", help="input file in iCNF format")
+    conquer_parser.add_argument("output", help="output file for the solution")
+    solve_parser = subparsers.add_parser("solve", help="split and conquer")
+    solve_parser.add_argument("input", help="input file in DIMACS format")
+    solve_parser.add_argument("output", help="output file for the solution")
+    for p in (split_parser, solve_parser):
+        p.add_argument("--depth", type=int, default=6, help="maximal number of decisions in a cube (default: 6)")
+        p.add_argument("--candidates", type=int, default=20,
+                       help="variables tried by the lookahead at every node (default: 20)")
+    for p in (conquer_parser, solve_parser):
+        p.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of local worker processes")
+        p.add_argument("--dir", default=None,
+                       help="directory shared by the workers of all machines (default: a temporary directory)")
+    args = parser.parse_args()
+
+    if args.command in ("split", "solve"):
+        arena = read_dimacs(args.input)
+        start = time()
+        lookahead = Lookahead(arena, args.candidates)
+        cubes = lookahead.split(args.depth)
+        print(f"{len(cubes)} cubes ({lookahead.refuted} refuted by lookahead) in {time() - start:.2f} s")
+        if args.command == "split":
+            write_icnf(args.cubes, arena, cubes)
+    else:
+        arena, cubes = read_icnf(args.cubes)
+    if args.command in ("conquer", "solve"):
+        start = time()
+        status, s = conquer(arena, cubes, args.jobs, args.dir, verbose=True)
+        print(status, 'time', time() - start)
+        if s is not None:
+            print(verify(arena, s)[0])
+        if status != "UNKNOWN":
+            write_output(args.output, s)
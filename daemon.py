@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
+
+# The solver modules (and NumPy) are imported by the workers only: the fork server loads them once and every
+# worker is forked from it, so neither the workers nor the client pay for the imports.
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"sat-solver-{os.getuid()}.sock")
+PRELOAD = ["batch"]
+THROUGHPUT_WINDOW = 60.0  # seconds
+SOLVERS = ["cdcl", "dpll"]
+
+
+def worker(conn, memory_limit: float, options: dict):
+    # runs in a process forked from the fork server, solves jobs until it gets None or the pipe closes;
+    # Ctrl-C reaches the whole process group, the daemon decides when the workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from batch import set_memory_limit, solve_safely
+    set_memory_limit(memory_limit)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        path, data, job_options = job
+        conn.send(solve_safely(path, dict(options, data=data, **job_options)))
+    conn.close()
+
+
+class Worker:
+    # a warm worker process; a new one is started when it was killed or died
+    def __init__(self, context, memory_limit: float, options: dict):
+        self.context = context
+        self.memory_limit = memory_limit
+        self.options = options
+        self.process = None
+        self.conn = None
+        self.started = 0
+
+    def ensure_running(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        self.stop()
+        self.conn, child = self.context.Pipe()
+        self.process = self.context.Process(target=worker, args=(child, self.memory_limit, self.options),
+                                            daemon=True)
+        self.process.start()
+        child.close()
+        self.started += 1
+
+    def call(self, path: str, data: bytes, options: dict, time_limit: float):
+        # runs in a thread of the daemon, the worker is killed after time_limit seconds
+        self.ensure_running()
+        try:
+            self.conn.send((path, data, options))
+            if not self.conn.poll(time_limit):
+                self.stop()
+                return {"status": "TIMEOUT", "cpu": None}
+            return self.conn.recv()
+        except (EOFError, OSError):
+            # the process died without an answer
+            exitcode = self.process.exitcode
+            self.stop()
+            return {"status": "ERROR", "error": f"worker exited with code {exitcode}", "cpu": None}
+
+    def stop(self, graceful: bool = False):
+        if self.process is None:
+            return
+        if graceful and self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = self.conn = None
+
+
+class Job:
+    def __init__(self, number: int, request: dict, writer):
+        self.number = number
+        self.id = request.get("id")
+        self.name = request.get("path") or request.get("name") or f"<job {number}>"
+        self.data = None if request.get("dimacs") is None else request["dimacs"].encode()
+        self.options = {name: request[name] for name in ("solver", "preprocess") if name in request}
+        self.time_limit = request.get("time_limit")
+        self.writer = writer
+        self.submitted = time()
+        self.cancelled = False
+
+
+class Daemon:
+    # Solves jobs sent over a Unix socket on a pool of warm worker processes. Requests and responses are
+    # JSON lines; a connection may send any number of requests and gets the results in the order of
+    # completion:
+    #   {"op": "solve", "id": ..., "path": FILE or "dimacs": TEXT, "solver": "cdcl", "preprocess": false,
+    #    "time_limit": SECONDS} -> {"event": "queued", "job": N, "queue": depth}, then {"event": "result", ...}
+    #   {"op": "status"} -> {"event": "status", "queue": depth, "throughput": jobs per second, ...}
+    #   {"op": "shutdown"} -> {"event": "shutdown"}, the queued and running jobs are finished first
+    # At most queue_size jobs wait, a job beyond that is rejected with an error. The time limit of a job
+    # is at most time_limit; a worker that exceeds it is killed and replaced. A client keeps the connection
+    # open until it has all results, the queued jobs of a closed connection are dropped.
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, jobs: int = os.cpu_count(), queue_size: int = 100,
+                 time_limit: float = None, memory_limit: float = None, max_request_mb: float = 256, **options):
+        self.socket_path = socket_path
+        self.jobs = jobs
+        self.queue_size = queue_size
+        self.time_limit = time_limit
+        self.max_request = int(max_request_mb * 2**20)
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(PRELOAD)
+        self.workers = [Worker(context, memory_limit, options) for _ in range(jobs)]
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.queue = None
+        self.server = None
+        self.closing = None
+        self.connections = dict()  # {handler task: writer}
+        self.numbers = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.statuses = dict()
+        self.finished = deque()  # completion times in the last THROUGHPUT_WINDOW seconds
+        self.started = time()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.closing = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.shutdown)
+        if os.path.exists(self.socket_path):
+            if await self.alive():
+                raise RuntimeError(f"a daemon is already listening on {self.socket_path}")
+            os.unlink(self.socket_path)
+        for w in self.workers:
+            await loop.run_in_executor(self.executor, w.ensure_running)
+        self.server = await asyncio.start_unix_server(self.handle, self.socket_path, limit=self.max_request)
+        os.chmod(self.socket_path, 0o600)
+        dispatchers = [asyncio.create_task(self.dispatch(w)) for w in self.workers]
+        print(f"Listening on {self.socket_path} with {self.jobs} workers", file=sys.stderr)
+        await self.closing.wait()
+        self.server.close()
+        # the dispatchers finish the queued jobs first
+        for _ in dispatchers:
+            self.queue.put_nowait(None)
+        await asyncio.gather(*dispatchers)
+        for w in self.workers:
+            await loop.run_in_executor(self.executor, w.stop, True)
+        self.executor.shutdown()
+        # the connections that are still open get the end of the stream
+        for task, writer in list(self.connections.items()):
+            writer.close()
+        await asyncio.gather(*self.connections)
+        os.unlink(self.socket_path)
+        print(f"Stopped after {self.completed} jobs", file=sys.stderr)
+
+    async def alive(self):
+        # whether another daemon listens on the socket
+        try:
+            _, writer = await asyncio.open_unix_connection(self.socket_path)
+        except OSError:
+            return False
+        writer.close()
+        return True
+
+    def shutdown(self):
+        if not self.closing.is_set():
+            print("Shutting down, finishing the queued jobs", file=sys.stderr)
+            self.closing.set()
+
+    async def dispatch(self, w: Worker):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            if job is None:
+                break
+            if job.cancelled:
+                continue
+            self.running += 1
+            start = time()
+            try:
+                limits = [t for t in (job.time_limit, self.time_limit) if t is not None]
+                result = await loop.run_in_executor(self.executor, w.call, job.name, job.data, job.options,
+                                                    min(limits, default=None))
+            except Exception as e:
+                # the worker may hold a job of unknown state, the next job gets a new one
+                result = {"status": "ERROR", "error": f"{type(e).__name__}: {e}", "cpu": None}
+                await loop.run_in_executor(self.executor, w.stop)
+            finally:
+                self.running -= 1
+            now = time()
+            self.completed += 1
+            self.finished.append(now)
+            line = {"event": "result", "id": job.id, "job": job.number, "instance": job.name,
+                    "status": result.pop("status"), "wall": now - start, "waited": start - job.submitted}
+            line.update(result)
+            self.statuses[line["status"]] = self.statuses.get(line["status"], 0) + 1
+            await self.send(job.writer, line)
+
+    async def handle(self, reader, writer):
+        jobs = []
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await self.send(writer, {"event": "error", "error": "request too long"})
+                    break
+                except ConnectionError:
+                    break
+                if len(line) == 0:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("not an object")
+                except ValueError as e:
+                    await self.send(writer, {"event": "error", "error": f"bad request: {e}"})
+                    continue
+                op = request.get("op", "solve")
+                if op == "solve":
+                    job = self.submit(request, writer)
+                    if isinstance(job, str):
+                        await self.send(writer, {"event": "error", "id": request.get("id"), "error": job})
+                    else:
+                        jobs.append(job)
+                        await self.send(writer, {"event": "queued", "id": job.id, "job": job.number,
+                                                 "queue": self.queue.qsize()})
+                elif op == "status":
+                    await self.send(writer, dict(self.status(), event="status"))
+                elif op == "shutdown":
+                    await self.send(writer, {"event": "shutdown"})
+                    self.shutdown()
+                else:
+                    await self.send(writer, {"event": "error", "error": f"unknown op {op!r}"})
+        finally:
+            # the client is gone, its queued jobs are dropped
+            for job in jobs:
+                job.cancelled = True
+            writer.close()
+            del self.connections[asyncio.current_task()]
+
+    def submit(self, request: dict, writer):
+        # a queued job or the reason it was rejected
+        if self.closing.is_set():
+            return "shutting down"
+        if (request.get("path") is None) == (request.get("dimacs") is None):
+            return "a job needs either path or dimacs"
+        for name in ("path", "dimacs", "name"):
+            if request.get(name) is not None and not isinstance(request[name], str):
+                return f"{name} has to be a string"
+        time_limit = request.get("time_limit")
+        if time_limit is not None and (isinstance(time_limit, bool) or not isinstance(time_limit, (int, float))
+                                       or not 0 < time_limit < float("inf")):
+            return "time_limit has to be a positive number"
+        if request.get("solver", "cdcl") not in SOLVERS:
+            return f"solver has to be one of {', '.join(SOLVERS)}"
+        if not isinstance(request.get("preprocess", False), bool):
+            return "preprocess has to be true or false"
+        if request.get("path") is not None and not os.path.isabs(request["path"]):
+            return "path has to be absolute"
+        if self.queue.qsize() >= self.queue_size:
+            self.rejected += 1
+            return f"queue full ({self.queue_size} jobs)"
+        self.numbers += 1
+        job = Job(self.numbers, request, writer)
+        self.queue.put_nowait(job)
+        return job
+
+    def status(self):
+        now = time()
+        while len(self.finished) > 0 and self.finished[0] < now - THROUGHPUT_WINDOW:
+            self.finished.popleft()
+        uptime = now - self.started
+        return {"workers": self.jobs, "running": self.running, "queue": self.queue.qsize(),
+                "queue_size": self.queue_size, "completed": self.completed, "rejected": self.rejected,
+                "statuses": self.statuses, "uptime": uptime,
+                "throughput": len(self.finished) / max(min(uptime, THROUGHPUT_WINDOW), 1e-9),
+                "restarts": sum(w.started for w in self.workers) - self.jobs, "closing": self.closing.is_set()}
+
+    async def send(self, writer, message: dict):
+        if writer.is_closing():
+            return
+        writer.write((json.dumps(message) + "\n").encode())
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+class Client:
+    # blocking client of a daemon
+    def __init__(self, socket_path: str = DEFAULT_SOCKET):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.file = self.socket.makefile("rwb")
+
+    def send(self, message: dict):
+        self.file.write((json.dumps(message) + "\n").encode())
+        self.file.flush()
+
+    def receive(self):
+        line = self.file.readline()
+        if len(line) == 0:
+            raise ConnectionError("the daemon closed the connection")
+        return json.loads(line)
+
+    def request(self, message: dict):
+        self.send(message)
+        return self.receive()
+
+    def solve(self, jobs: list, **options):
+        # jobs are (name, DIMACS text or None for a file), yields the results in the order of completion;
+        # a job that does not fit into the queue is sent again after one of the others is done
+        results = deque()
+        waiting = 0
+        for name, text in jobs:
+            request = dict(options, op="solve", id=name)
+            if text is None:
+                request["path"] = os.path.abspath(name)
+            else:
+                request.update(name=name, dimacs=text)
+            while True:
+                self.send(request)
+                # results of earlier jobs may come before the answer
+                answer = self.receive()
+                while answer["event"] == "result":
+                    results.append(answer)
+                    waiting -= 1
+                    answer = self.receive()
+                if answer["event"] == "queued":
+                    waiting += 1
+                    break
+                if not answer["error"].startswith("queue full"):
+                    results.append({"event": "result", "id": name, "instance": name, "status": "ERROR",
+                                    "error": answer["error"]})
+                    break
+                if waiting > 0:
+                    results.append(self.receive())
+                    waiting -= 1
+                else:
+                    sleep(0.1)
+            while len(results) > 0:
+                yield results.popleft()
+        for _ in range(waiting):
+            yield self.receive()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="solver daemon with warm workers on a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"path of the socket (default: {DEFAULT_SOCKET})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="start the daemon")
+    serve.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    serve.add_argument("--queue-size", type=int, default=100, help="maximal number of waiting jobs")
+    serve.add_argument("--time-limit", type=float, default=None, help="maximal wall time of a job in seconds")
+    serve.add_argument("--memory-limit", type=float, default=None,
+                       help="memory a job may allocate in MB (address space on top of the worker)")
+    serve.add_argument("--max-request-mb", type=float, default=256, help="maximal size of a request in MB")
+    serve.add_argument("--cache", metavar="FILE", help="result cache shared by the workers (see cache.py)")
+    solve = subparsers.add_parser("solve", help="solve files on the daemon, one JSON line per file")
+    solve.add_argument("inputs", nargs="+", help="DIMACS files, - for the standard input")
+    solve.add_argument("--solver", choices=SOLVERS, default="cdcl")
+    solve.add_argument("--preprocess", action="store_true",
+                       help="simplify the formulas with subsumption and variable elimination first")
+    solve.add_argument("--time-limit", type=float, default=None, help="wall time limit per job in seconds")
+    solve.add_argument("-o", "--output", help="file for the results (default: standard output)")
+    subparsers.add_parser("status", help="print the queue depth, throughput and counters of the daemon")
+    subparsers.add_parser("shutdown", help="stop the daemon after the queued jobs")
+    args = parser.parse_args()
+    if args.command == "serve":
+        from batch import MIN_MEMORY_LIMIT
+        if args.memory_limit is not None and args.memory_limit < MIN_MEMORY_LIMIT:
+            parser.error(f"--memory-limit has to be at least {MIN_MEMORY_LIMIT} MB")
+        daemon = Daemon(args.socket, args.jobs, args.queue_size, args.time_limit, args.memory_limit,
+                        args.max_request_mb, cache=args.cache)
+        try:
+            asyncio.run(daemon.serve())
+        except RuntimeError as e:
+            parser.exit(1, f"Error: {e}\n")
+        raise SystemExit(0)
+    try:
+        client = Client(args.socket)
+    except OSError as e:
+        parser.exit(1, f"Error: no daemon on {args.socket} ({e.strerror})\n")
+    if args.command == "solve":
+        jobs = [("<stdin>", sys.stdin.read()) if name == "-" else (name, None) for name in args.inputs]
+        options = {"solver": args.solver, "preprocess": args.preprocess}
+        if args.time_limit is not None:
+            options["time_limit"] = args.time_limit
+        out = sys.stdout if args.output is None else open(args.output, "w")
+        for result in client.solve(jobs, **options):
+            del result["event"]
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+        if out is not sys.stdout:
+            out.close()
+    elif args.command == "status":
+        for name, value in client.request({"op": "status"}).items():
+            if name != "event":
+                print(f"{name}: {value}")
+    else:
+        client.request({"op": "shutdown"})
+    client.close()
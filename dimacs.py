@@ -0,0 +1,160 @@
+import bz2
+import gzip
+import io
+import lzma
+import warnings
+import numpy as np
+from array import array
+from time import time
+from binary_cnf import is_binary, read_binary
+from cnf import ClauseArena
+
+CHUNK_SIZE = 1 << 20
+# compressed files are recognized by their first bytes, the suffix does not matter
+MAGIC = [(b"\x1f\x8b", gzip.open), (b"\xfd7zXZ\x00", lzma.open), (b"BZh", bz2.open)]
+NUMERIC = b"0123456789- \t\r\n"
+
+
+class DimacsError(ValueError):
+    pass
+
+
+def open_dimacs(src_path: str):
+    # binary file object, decompressed on the fly if needed
+    with open(src_path, "rb") as file:
+        head = file.read(6)
+    for magic, opener in MAGIC:
+        if head.startswith(magic):
+            return opener(src_path, "rb")
+    return open(src_path, "rb", buffering=CHUNK_SIZE)
+
+
+class DimacsParser:
+    # Streams a DIMACS CNF file in chunks and builds a ClauseArena directly.
+    # Clauses end at 0 and may span several lines or share one; comment lines may appear anywhere
+    # and a line with % ends the formula (SATLIB). With strict the header counts must match the clauses,
+    # otherwise a mismatch is only recorded in warnings. Files in the binary format of binary_cnf.py are
+    # mapped into memory instead.
+    def __init__(self, src_path: str, strict: bool = False):
+        self.src_path = src_path
+        self.strict = strict
+        self.num_of_vars = None  # from the header
+        self.num_of_clauses = None
+        self.num_of_bytes = 0
+        self.seconds = 0.0
+        self.warnings = []
+        self.done = False
+
+    def parse(self, data: bytes = None):
+        # data is the text of the formula, otherwise the file src_path is read
+        start = time()
+        if data is None and is_binary(self.src_path):
+            arena = read_binary(self.src_path)
+            self.num_of_vars, self.num_of_clauses = arena.num_of_vars, len(arena)
+            self.num_of_bytes = arena.nbytes()
+            self.seconds = time() - start
+            return arena
+        arena = None
+        pending = np.zeros(0, dtype=np.int64)  # numbers of a clause that is not terminated yet
+        rest = b""
+        with open_dimacs(self.src_path) if data is None else io.BytesIO(data) as file:
+            while not self.done:
+                chunk = file.read(CHUNK_SIZE)
+                self.num_of_bytes += len(chunk)
+                if len(chunk) == 0:
+                    data, rest = rest, b""
+                else:
+                    # cut after the last newline so no token or line is split between chunks
+                    end = chunk.rfind(b"\n") + 1
+                    if end == 0:
+                        rest += chunk
+                        continue
+                    data, rest = rest + chunk[:end], chunk[end:]
+                if arena is None or len(data.translate(None, NUMERIC)) > 0:
+                    data = self.filter_lines(data)
+                    if arena is None and self.num_of_vars is not None:
+                        arena = ClauseArena(self.num_of_vars)
+                if len(data) > 0:
+                    if arena is None:
+                        raise DimacsError(f"{self.src_path}: clauses before the 'p cnf' header")
+                    pending = self.add_clauses(arena, pending, data)
+                if len(chunk) == 0:
+                    break
+        if arena is None:
+            raise DimacsError(f"{self.src_path}: missing 'p cnf' header")
+        if len(pending) > 0:
+            self.warn("last clause is not terminated by 0")
+            arena.add_clause([2*n if n > 0 else 1-2*n for n in pending.tolist()])
+        if len(arena) != self.num_of_clauses:
+            self.warn(f"header declares {self.num_of_clauses} clauses, found {len(arena)}")
+        self.seconds = time() - start
+        return arena
+
+    def filter_lines(self, data: bytes):
+        # drops comments and reads the header, returns the remaining clause lines
+        ret = []
+        for line in data.split(b"\n"):
+            line = line.strip()
+            if len(line) == 0 or line[:1] == b"c":
+                continue
+            if line[:1] == b"%":
+                self.done = True
+                break
+            if line[:1] == b"p":
+                self.read_header(line)
+                continue
+            ret.append(line)
+        return b"\n".join(ret)
+
+    def read_header(self, line: bytes):
+        problem = line.split()
+        if self.num_of_vars is not None:
+            raise DimacsError(f"{self.src_path}: more than one header")
+        if len(problem) != 4 or problem[1] != b"cnf":
+            raise DimacsError(f"{self.src_path}: bad header {line.decode(errors='replace')!r}")
+        try:
+            self.num_of_vars, self.num_of_clauses = int(problem[2]), int(problem[3])
+        except ValueError:
+            raise DimacsError(f"{self.src_path}: bad header {line.decode(errors='replace')!r}")
+
+    def add_clauses(self, arena: ClauseArena, pending, data: bytes):
+        # converts all numbers at once and adds the clauses terminated in data,
+        # returns the numbers of the unterminated clause at the end
+        if len(data.translate(None, NUMERIC)) > 0:
+            raise DimacsError(f"{self.src_path}: unexpected characters {data.translate(None, NUMERIC)[:20]!r}")
+        with warnings.catch_warnings():
+            # malformed numbers (e.g. 1-2) stop the conversion with a warning
+            warnings.simplefilter("error")
+            try:
+                numbers = np.fromstring(data, dtype=np.int64, sep=" ")
+            except (DeprecationWarning, ValueError):
+                raise DimacsError(f"{self.src_path}: malformed number")
+        numbers = np.concatenate((pending, numbers))
+        ends = np.flatnonzero(numbers == 0)
+        if len(ends) == 0:
+            return numbers
+        clauses = numbers[:ends[-1]+1]
+        clauses = clauses[clauses != 0]
+        if len(clauses) > 0 and np.abs(clauses).max() > arena.num_of_vars:
+            self.warn(f"variable {np.abs(clauses).max()} is larger than {self.num_of_vars} declared in the header")
+        lits = array('i', np.where(clauses > 0, 2*clauses, 1-2*clauses).astype(np.int32).tobytes())
+        sizes = array('i', (np.diff(ends, prepend=-1) - 1).astype(np.int32).tobytes())
+        arena.add_clauses(lits, sizes)
+        return numbers[ends[-1]+1:]
+
+    def warn(self, message: str):
+        if self.strict:
+            raise DimacsError(f"{self.src_path}: {message}")
+        self.warnings.append(message)
+
+    def throughput(self):
+        # MB/s of the (decompressed) input
+        return self.num_of_bytes / max(self.seconds, 1e-9) / 1e6
+
+
+def read_dimacs(src_path: str, strict: bool = False):
+    return DimacsParser(src_path, strict).parse()
+
+
+def read_dimacs_text(data: bytes, name: str = "<text>", strict: bool = False):
+    return DimacsParser(name, strict).parse(data)
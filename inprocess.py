@@ -0,0 +1,183 @@
+from time import time
+from cnf import CARDINALITY
+
+
+def implication_graph(formula):
+    # binary clauses (a ∨ b) with both literals unassigned as the implications ¬a -> b and ¬b -> a,
+    # graph[l] lists the literals implied by l
+    values = formula.values
+    graph = [[] for _ in range(len(values))]
+    learnts = formula.learnts
+    for arena, deleted in ((formula.clauses, None), (learnts.clauses, learnts.deleted)):
+        lits, starts, sizes = arena.lits, arena.starts, arena.sizes
+        for i in range(len(sizes)):
+            if sizes[i] != 2 or deleted is not None and deleted[i]:
+                continue
+            a, b = lits[starts[i]], lits[starts[i]+1]
+            if values[a] == 0 and values[b] == 0:
+                graph[a ^ 1].append(b)
+                graph[b ^ 1].append(a)
+    return graph
+
+
+def strongly_connected(graph: list):
+    # Tarjan's algorithm with an explicit stack, returns the components with more than one literal;
+    # the literals of a component imply each other, so they are equivalent
+    n = len(graph)
+    index = [-1]*n
+    low = [0]*n
+    on_stack = [False]*n
+    stack = []
+    components = []
+    counter = 0
+    for root in range(n):
+        if index[root] != -1 or len(graph[root]) == 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]  # (literal, next edge to follow)
+        while len(work) > 0:
+            v, i = work[-1]
+            if i < len(graph[v]):
+                work[-1] = (v, i+1)
+                w = graph[v][i]
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, 0))
+                elif on_stack[w]:
+                    low[v] = min(low[v], index[w])
+                continue
+            work.pop()
+            if len(work) > 0:
+                u = work[-1][0]
+                low[u] = min(low[u], low[v])
+            if low[v] == index[v]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component.append(w)
+                    if w == v:
+                        break
+                if len(component) > 1:
+                    components.append(component)
+    return components
+
+
+class Inprocessor:
+    # Simplification of a CDCL solver on level 0, before the search and then every interval conflicts at a
+    # restart (see CDCL.inprocess). A round probes literals of the binary implication graph within
+    # time_limit seconds: a literal whose propagation fails is fixed to false on level 0, and every literal
+    # it implies through a longer clause gives a hyper-binary resolvent (¬probe ∨ implied), at most
+    # max_binaries per round, which reduce_learned deletes like other induced clauses. Then the strongly
+    # connected components of the graph are equivalent literals, every component is replaced by its literal
+    # with the smallest variable in all clauses. Variables of cardinality constraints are not replaced.
+    def __init__(self, time_limit: float = 1.0, interval: int = 5000, max_binaries: int = 1000):
+        self.time_limit = time_limit
+        self.interval = interval
+        self.max_binaries = max_binaries
+        self.next_round = 0  # conflicts of the solver before the next round
+        self.rounds = 0
+        self.seconds = 0.0
+        self.failed = 0
+        self.binaries = 0
+        self.substituted = 0
+
+    def run(self, solver):
+        # one round on level 0, returns False if the formula is unsatisfiable
+        start = time()
+        self.rounds += 1
+        ok = solver.deduce() is None and self.probe(solver, start + self.time_limit) and self.substitute(solver)
+        self.next_round = solver.conflicts + self.interval
+        self.seconds += time() - start
+        return ok
+
+    def probe(self, solver, deadline: float):
+        formula, reason = solver.formula, solver.reason
+        values = formula.values
+        graph = implication_graph(formula)
+        # the literals that imply the most first
+        candidates = sorted((l for l in range(2, len(graph)) if len(graph[l]) > 0), key=lambda l: -len(graph[l]))
+        binaries = 0
+        for literal in candidates:
+            if time() >= deadline:
+                break
+            if values[literal] != 0:
+                continue
+            solver.trail_lim.append(len(solver.trail))
+            solver.enqueue(literal, -1)
+            conflict = solver.deduce()
+            resolvents = []
+            if conflict is None and binaries < self.max_binaries:
+                for l in solver.trail[solver.trail_lim[0]+1:]:
+                    ref = reason[l >> 1]
+                    if ref != CARDINALITY and len(formula.clause(ref)) > 2:
+                        resolvents.append([l, literal ^ 1])
+            solver.erase(1)
+            if conflict is not None:
+                # failed literal
+                self.failed += 1
+                if solver.proof is not None:
+                    solver.proof.add([literal ^ 1])
+                solver.enqueue(literal ^ 1, -1)
+                if solver.deduce() is not None:
+                    return False
+                continue
+            for literals in resolvents[:self.max_binaries - binaries]:
+                # on level 0 the clause has no LBD yet, above the glue clauses it is deleted by the next
+                # reductions unless a conflict lowers its LBD to 2
+                formula.add_induced_clause(literals, 3)
+                if solver.proof is not None:
+                    solver.proof.add(literals)
+                binaries += 1
+        self.binaries += binaries
+        return True
+
+    def substitute(self, solver):
+        formula = solver.formula
+        values = formula.values
+        constrained = {l >> 1 for c in formula.cards for l in c}
+        mapping = list(range(len(values)))
+        for component in strongly_connected(implication_graph(formula)):
+            variables = {l >> 1 for l in component}
+            if len(variables) < len(component):
+                # a literal equivalent to its negation
+                if solver.proof is not None:
+                    literal = next(l for l in component if l ^ 1 in component)
+                    solver.proof.add([literal])
+                return False
+            if len(variables & constrained) > 0:
+                continue
+            representative = min(component)
+            for l in component:
+                if l != representative:
+                    mapping[l] = representative
+                    mapping[l ^ 1] = representative ^ 1
+        replaced = [var for var in range(1, formula.num_of_vars+1) if mapping[2*var] != 2*var]
+        if len(replaced) == 0:
+            return True
+        for var in replaced:
+            solver.equivalent[var] = mapping[2*var]
+            solver.substituted.append((var, mapping[2*var]))
+        self.substituted += len(replaced)
+        # the clause references change, the assignments on level 0 need no reasons
+        for l in solver.trail:
+            solver.reason[l >> 1] = -1
+        units = formula.rewrite(mapping, solver.proof)
+        if units is None:
+            return False
+        for literal in units:
+            if values[literal] == -1:
+                return False
+            if values[literal] == 0:
+                solver.enqueue(literal, -1)
+        return solver.deduce() is None
+
+    def report(self):
+        return f"{self.rounds} rounds in {self.seconds:.3f} s: {self.failed} failed literals, " \
+               f"{self.binaries} hyper-binary resolvents, {self.substituted} variables substituted"
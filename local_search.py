@@ -0,0 +1,181 @@
+import argparse
+import random
+import numpy as np
+from time import time
+from cnf import ClauseArena
+from dimacs import read_dimacs
+
+ALGORITHMS = ["probsat", "walksat"]
+
+
+class LocalSearch:
+    # Stochastic local search: start from a random assignment and flip variables of falsified clauses
+    # until none is left. For every clause the number of true literals and the xor of the variables of
+    # the true literals (= the only true variable when the count is 1) are kept, for every variable the
+    # break (clauses that become false when it is flipped) and make (false clauses that it would
+    # satisfy) scores, and the false clauses are kept in a list with the position of each clause, so a
+    # flip only visits the clauses of the flipped variable. The counts are computed with NumPy at every
+    # restart, the flips work on plain lists, which are faster than NumPy arrays for single elements.
+    def __init__(self, arena: ClauseArena, seed: int = None):
+        self.num_of_vars = arena.num_of_vars
+        self.random = random.Random(seed)
+        # tautologies are always true and duplicate literals would break the counts
+        self.clauses = []
+        for c in arena:
+            literals = list(dict.fromkeys(c))
+            if not any(l ^ 1 in literals for l in literals):
+                self.clauses.append(literals)
+        self.occurs = [[] for _ in range(2*(self.num_of_vars+1))]  # clauses of every literal
+        for i, c in enumerate(self.clauses):
+            for l in c:
+                self.occurs[l].append(i)
+        sizes = np.array([len(c) for c in self.clauses], dtype=np.int64)
+        self.lits = np.array([l for c in self.clauses for l in c], dtype=np.int64)
+        self.clause_of = np.repeat(np.arange(len(self.clauses)), sizes)  # clause of every entry of lits
+        self.empty = bool((sizes == 0).any())
+        self.value = []  # 0 or 1 for every variable
+        self.best = None  # assignment with the fewest false clauses so far
+        self.best_false = None
+        self.flips = 0
+
+    def restart(self, value: list):
+        # the counts of the assignment, computed for all clauses at once
+        self.value = list(value)
+        value = np.array(self.value, dtype=np.int64)
+        true = value[self.lits >> 1] ^ (self.lits & 1) == 1
+        m = len(self.clauses)
+        count = np.bincount(self.clause_of, weights=true, minlength=m).astype(np.int64)
+        critical = np.zeros(m, dtype=np.int64)
+        np.bitwise_xor.at(critical, self.clause_of[true], self.lits[true] >> 1)
+        n = self.num_of_vars + 1
+        self.true_count = count.tolist()
+        self.critical = critical.tolist()
+        self.breaks = np.bincount(critical[count == 1], minlength=n).tolist()
+        false = count == 0
+        self.makes = np.bincount(self.lits[false[self.clause_of]] >> 1, minlength=n).tolist()
+        self.false = np.flatnonzero(false).tolist()
+        self.position = [-1]*m
+        for i, c in enumerate(self.false):
+            self.position[c] = i
+        self.remember()
+
+    def remember(self):
+        if self.best_false is None or len(self.false) < self.best_false:
+            self.best_false = len(self.false)
+            self.best = list(self.value)
+
+    def flip(self, var: int):
+        value, true_count, critical = self.value, self.true_count, self.critical
+        breaks, makes, false, position = self.breaks, self.makes, self.false, self.position
+        value[var] ^= 1
+        self.flips += 1
+        true_lit = 2*var + (1 - value[var])
+        for c in self.occurs[true_lit]:
+            count = true_count[c]
+            true_count[c] = count + 1
+            critical[c] ^= var
+            if count == 0:
+                # satisfied now, var is its only true literal
+                breaks[var] += 1
+                for l in self.clauses[c]:
+                    makes[l >> 1] -= 1
+                last = false.pop()
+                if last != c:
+                    false[position[c]] = last
+                    position[last] = position[c]
+                position[c] = -1
+            elif count == 1:
+                breaks[critical[c] ^ var] -= 1
+        for c in self.occurs[true_lit ^ 1]:
+            count = true_count[c] - 1
+            true_count[c] = count
+            critical[c] ^= var
+            if count == 0:
+                breaks[var] -= 1
+                for l in self.clauses[c]:
+                    makes[l >> 1] += 1
+                position[c] = len(false)
+                false.append(c)
+            elif count == 1:
+                breaks[critical[c]] += 1
+
+    def pick_probsat(self, literals, weights: list):
+        breaks = self.breaks
+        probabilities = [weights[breaks[l >> 1]] for l in literals]
+        r = self.random.random()*sum(probabilities)
+        for l, p in zip(literals, probabilities):
+            r -= p
+            if r <= 0:
+                return l >> 1
+        return literals[-1] >> 1
+
+    def pick_walksat(self, literals, noise: float):
+        # a variable that breaks nothing, else with probability noise a random one, else one that breaks
+        # the fewest clauses (and makes the most of them)
+        breaks, makes = self.breaks, self.makes
+        scores = [(breaks[l >> 1], -makes[l >> 1]) for l in literals]
+        best = min(scores)
+        if best[0] > 0 and self.random.random() < noise:
+            return self.random.choice(literals) >> 1
+        return self.random.choice([l for l, s in zip(literals, scores) if s == best]) >> 1
+
+    def solve(self, algorithm: str = "probsat", max_flips: int = None, time_limit: float = None,
+              restart_flips: int = None, noise: float = 0.567, cb: float = 2.38, eps: float = 1.0,
+              start: list = None):
+        # Flips until every clause is true, returns the model as a list of (variable, value) or None after
+        # max_flips flips or time_limit seconds. probsat flips a variable of a random false clause with
+        # probability proportional to (eps + break)**-cb, walksat as in pick_walksat. The search starts
+        # from start (a value of every variable) or a random assignment and again from a random one every
+        # restart_flips flips; best keeps the assignment with the fewest false clauses.
+        if self.empty:
+            return None
+        deadline = None if time_limit is None else time() + time_limit
+        weights = [(eps + b)**-cb for b in range(max(map(len, self.occurs), default=0) + 1)]
+        if start is None:
+            start = [0] + [self.random.getrandbits(1) for _ in range(self.num_of_vars)]
+        self.restart(start)
+        flips = 0
+        while len(self.false) > 0:
+            if max_flips is not None and flips >= max_flips:
+                return None
+            if flips % 1000 == 0 and deadline is not None and time() >= deadline:
+                return None
+            if restart_flips is not None and flips > 0 and flips % restart_flips == 0:
+                self.restart([0] + [self.random.getrandbits(1) for _ in range(self.num_of_vars)])
+            literals = self.clauses[self.false[self.random.randrange(len(self.false))]]
+            if algorithm == "probsat":
+                var = self.pick_probsat(literals, weights)
+            else:
+                var = self.pick_walksat(literals, noise)
+            self.flip(var)
+            flips += 1
+            if len(self.false) < self.best_false:
+                self.remember()
+        self.best_false = 0
+        self.best = list(self.value)
+        return [(var, bool(self.value[var])) for var in range(1, self.num_of_vars+1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="local search (probSAT or WalkSAT) SAT solver, incomplete")
+    parser.add_argument("input", help="input file in DIMACS format")
+    parser.add_argument("output", help="output file for the solution, UNKNOWN if none is found")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="probsat", help="(default: probsat)")
+    parser.add_argument("--time-limit", type=float, default=60, help="seconds of search (default: 60)")
+    parser.add_argument("--max-flips", type=int, default=None, help="give up after this many flips")
+    parser.add_argument("--restart-flips", type=int, default=None,
+                        help="start from a new random assignment every this many flips (default: never)")
+    parser.add_argument("--noise", type=float, default=0.567, help="random walk probability of walksat")
+    parser.add_argument("--cb", type=float, default=2.38, help="break exponent of probsat")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    args = parser.parse_args()
+    from SAT_solver_CDCL import write_output
+    arena = read_dimacs(args.input)
+    search = LocalSearch(arena, seed=args.seed)
+    start = time()
+    s = search.solve(args.algorithm, max_flips=args.max_flips, time_limit=args.time_limit,
+                     restart_flips=args.restart_flips, noise=args.noise, cb=args.cb)
+    print('time', time() - start)
+    print(f"{search.flips} flips ({search.flips / max(time() - start, 1e-9):.0f} per second), "
+          f"{search.best_false} clauses false at best")
+    write_output(args.output, s, "SAT" if s is not None else "UNKNOWN")
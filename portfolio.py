@@ -0,0 +1,126 @@
+import multiprocessing
+import queue
+from itertools import product
+from multiprocessing import shared_memory
+from time import time
+from cnf import ClauseArena
+from SAT_solver_CDCL import CDCL, Formula
+
+RING_SIZE = 1 << 20  # number of integers in the shared ring buffer
+
+
+def portfolio_configs(n: int):
+    # n diversified solver configurations, the first one is the default configuration
+    configs = []
+    for i, (branching, restarts, initial_phase) in enumerate(product(["evsids", "vsids"], ["luby", "glucose"],
+                                                                     ["false", "true", "random"])):
+        configs.append({"branching": branching, "restarts": restarts, "initial_phase": initial_phase,
+                        "seed": None if i == 0 else i})
+    while len(configs) < n:
+        # the same configurations again with other seeds
+        config = dict(configs[len(configs) % 12])
+        config["seed"] = len(configs)
+        configs.append(config)
+    return configs[:n]
+
+
+class ClauseRing:
+    # Induced clauses shared between the processes of the portfolio, stored in a ring buffer in
+    # shared memory. The first integer counts all integers ever written, clause records follow as
+    # [worker, lbd, size, literals...]. Writers and readers take the lock, a reader that falls more
+    # than the size of the ring behind skips the overwritten clauses.
+    def __init__(self, name: str, lock, worker: int, max_lbd: int = 2, max_size: int = 8):
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.ints = self.shm.buf.cast('i')
+        self.capacity = len(self.ints) - 1
+        self.lock = lock
+        self.worker = worker
+        self.max_lbd = max_lbd
+        self.max_size = max_size
+        self.read = 0
+        self.exported = 0
+        self.imported = 0
+
+    def export(self, literals, lbd: int):
+        # only short or low LBD clauses are worth sharing
+        if lbd > self.max_lbd and len(literals) > self.max_size:
+            return
+        record = [self.worker, lbd, len(literals)] + list(literals)
+        ints, capacity = self.ints, self.capacity
+        with self.lock:
+            written = ints[0]
+            for i, x in enumerate(record):
+                ints[1 + (written + i) % capacity] = x
+            ints[0] = written + len(record)
+        self.exported += 1
+
+    def receive(self):
+        # clauses written by the other workers since the last call, as (literals, lbd)
+        ints, capacity = self.ints, self.capacity
+        ret = []
+        with self.lock:
+            written = ints[0]
+            if written - self.read > capacity:
+                self.read = written
+            while self.read < written:
+                worker = ints[1 + self.read % capacity]
+                lbd = ints[1 + (self.read+1) % capacity]
+                size = ints[1 + (self.read+2) % capacity]
+                if worker != self.worker:
+                    ret.append(([ints[1 + (self.read+3+i) % capacity] for i in range(size)], lbd))
+                self.read += 3 + size
+        self.imported += len(ret)
+        return ret
+
+    def close(self):
+        self.ints.release()
+        self.shm.close()
+
+
+def run_worker(worker: int, arena: ClauseArena, config: dict, ring: str, lock, results):
+    # solve the formula with one configuration in a separate process,
+    # puts (worker, solution, conflicts, exported, imported) to the results queue
+    solver = CDCL(Formula(arena), **config)
+    if ring is not None:
+        solver.exchange = ClauseRing(ring, lock, worker)
+    solution = solver.solve()
+    if ring is not None:
+        solver.exchange.close()
+        results.put((worker, solution, solver.conflicts, solver.exchange.exported, solver.exchange.imported))
+    else:
+        results.put((worker, solution, solver.conflicts, 0, 0))
+
+
+def solve_portfolio(arena: ClauseArena, processes: int, share: bool = True, verbose: bool = False):
+    # run diversified configurations in parallel processes, the first answer wins and the other
+    # workers are terminated; returns the solution (or None) like CDCL.solve
+    configs = portfolio_configs(processes)
+    shm = shared_memory.SharedMemory(create=True, size=4*(RING_SIZE+1))
+    shm.buf[:4] = bytes(4)
+    lock = multiprocessing.Lock()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_worker, daemon=True,
+                                       args=(i, arena, config, shm.name if share else None, lock, results))
+               for i, config in enumerate(configs)]
+    start = time()
+    try:
+        for p in workers:
+            p.start()
+        while True:
+            try:
+                worker, solution, conflicts, exported, imported = results.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if not any(p.is_alive() for p in workers) and results.empty():
+                    raise RuntimeError("every worker of the portfolio failed")
+        if verbose:
+            print(f"worker {worker} {configs[worker]} answered after {time() - start:.2f} s, "
+                  f"{conflicts} conflicts, {exported} clauses exported, {imported} imported")
+        return solution
+    finally:
+        for p in workers:
+            p.terminate()
+        for p in workers:
+            p.join()
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,215 @@
+from time import time
+from cnf import ClauseArena
+
+SUBSUMED = -1  # result of subsumes() when the first clause subsumes the second one
+
+
+def signature(clause):
+    # every variable sets one of 64 bits, a clause can only subsume clauses with a superset of its bits
+    sig = 0
+    for l in clause:
+        sig |= 1 << ((l >> 1) & 63)
+    return sig
+
+
+def subsumes(c, d: set):
+    # None if c does not subsume d, SUBSUMED if it does and a literal l if c with l negated
+    # subsumes d, so that the negation of l can be removed from d (self-subsuming resolution)
+    ret = SUBSUMED
+    for l in c:
+        if l in d:
+            continue
+        if ret == SUBSUMED and l ^ 1 in d:
+            ret = l
+            continue
+        return None
+    return ret
+
+
+class Preprocessor:
+    # SatELite style simplification before search: unit propagation, backward subsumption,
+    # self-subsuming resolution and bounded variable elimination; extend_model reconstructs
+    # the values of the variables that were removed
+    def __init__(self, arena: ClauseArena, max_occurrences: int = 16, max_resolvent_size: int = 20,
+                 time_limit: float = 5.0):
+        self.num_of_vars = arena.num_of_vars
+        self.max_occurrences = max_occurrences
+        self.max_resolvent_size = max_resolvent_size
+        self.time_limit = time_limit
+        self.clauses = []  # list of literals or None when deleted
+        self.signatures = []
+        self.occurs = [set() for _ in range(2*(self.num_of_vars+1))]  # {literal: indices of clauses}
+        self.fixed = dict()  # {variable: value} from unit clauses
+        self.eliminated = []  # (pivot literal, clause) in the order of elimination
+        self.units = []
+        self.queue = []  # clauses to check for subsumption
+        self.unsat = False
+        self.stats = {technique: {"clauses": 0, "literals": 0, "variables": 0}
+                      for technique in ("units", "subsumption", "strengthening", "elimination")}
+        for c in arena:
+            literals = set(c)
+            if any(l ^ 1 in literals for l in literals):
+                continue  # tautology
+            self.add(sorted(literals))
+
+    def add(self, literals: list):
+        i = len(self.clauses)
+        self.clauses.append(literals)
+        self.signatures.append(signature(literals))
+        for l in literals:
+            self.occurs[l].add(i)
+        self.queue.append(i)
+        if len(literals) == 1:
+            self.units.append(literals[0])
+        elif len(literals) == 0:
+            self.unsat = True
+        return i
+
+    def delete(self, i: int, technique: str):
+        for l in self.clauses[i]:
+            self.occurs[l].discard(i)
+        self.stats[technique]["clauses"] += 1
+        self.stats[technique]["literals"] += len(self.clauses[i])
+        self.clauses[i] = None
+
+    def strengthen(self, i: int, literal: int, technique: str):
+        # remove the literal from the clause
+        self.clauses[i].remove(literal)
+        self.occurs[literal].discard(i)
+        self.signatures[i] = signature(self.clauses[i])
+        self.stats[technique]["literals"] += 1
+        self.queue.append(i)
+        if len(self.clauses[i]) == 1:
+            self.units.append(self.clauses[i][0])
+        elif len(self.clauses[i]) == 0:
+            self.unsat = True
+
+    def propagate_units(self):
+        while len(self.units) > 0 and not self.unsat:
+            literal = self.units.pop()
+            var = literal >> 1
+            if var in self.fixed:
+                if self.fixed[var] != (not literal & 1):
+                    self.unsat = True
+                continue
+            self.fixed[var] = not literal & 1
+            self.stats["units"]["variables"] += 1
+            for i in list(self.occurs[literal]):
+                self.delete(i, "units")
+            for i in list(self.occurs[literal ^ 1]):
+                self.strengthen(i, literal ^ 1, "units")
+
+    def subsumption(self, deadline: float = None):
+        # backward subsumption and self-subsuming resolution with every clause in the queue, the clauses
+        # left in the queue at the deadline are not checked
+        while len(self.queue) > 0 and not self.unsat:
+            if deadline is not None and time() >= deadline:
+                break
+            i = self.queue.pop()
+            c = self.clauses[i]
+            if c is None or len(c) == 0:
+                continue
+            sig = self.signatures[i]
+            # a clause subsumed by c contains its literal with the fewest occurrences or its negation
+            best = min(c, key=lambda l: len(self.occurs[l]) + len(self.occurs[l ^ 1]))
+            for j in list(self.occurs[best]) + list(self.occurs[best ^ 1]):
+                d = self.clauses[j]
+                if j == i or d is None or len(d) < len(c) or sig & ~self.signatures[j]:
+                    continue
+                ret = subsumes(c, set(d))
+                if ret == SUBSUMED:
+                    self.delete(j, "subsumption")
+                elif ret is not None:
+                    self.strengthen(j, ret ^ 1, "strengthening")
+            self.propagate_units()
+
+    def resolvents(self, var: int):
+        # non tautological resolvents on the variable, None if one of them is too long
+        ret = []
+        for i in self.occurs[2*var]:
+            for j in self.occurs[2*var+1]:
+                literals = set(self.clauses[i])
+                literals.discard(2*var)
+                tautology = False
+                for l in self.clauses[j]:
+                    if l == 2*var+1:
+                        continue
+                    if l ^ 1 in literals:
+                        tautology = True
+                        break
+                    literals.add(l)
+                if not tautology:
+                    if len(literals) > self.max_resolvent_size:
+                        return None
+                    ret.append(sorted(literals))
+        return ret
+
+    def eliminate(self, var: int):
+        # replace the clauses of the variable with their resolvents if there are not more of them
+        pos, neg = self.occurs[2*var], self.occurs[2*var+1]
+        if len(pos) + len(neg) == 0 or len(pos) > self.max_occurrences or len(neg) > self.max_occurrences:
+            return False
+        resolvents = self.resolvents(var)
+        if resolvents is None or len(resolvents) > len(pos) + len(neg):
+            return False
+        for literal in (2*var, 2*var+1):
+            for i in list(self.occurs[literal]):
+                self.eliminated.append((literal, self.clauses[i]))
+                self.delete(i, "elimination")
+        for r in resolvents:
+            self.add(r)
+            self.stats["elimination"]["clauses"] -= 1
+            self.stats["elimination"]["literals"] -= len(r)
+        self.stats["elimination"]["variables"] += 1
+        return True
+
+    def run(self):
+        # simplify the clauses, returns the simplified formula
+        deadline = time() + self.time_limit
+        self.propagate_units()
+        self.subsumption(deadline)
+        done = set()
+        while not self.unsat and time() < deadline:
+            candidates = [v for v in range(1, self.num_of_vars+1) if v not in done and v not in self.fixed]
+            candidates.sort(key=lambda v: len(self.occurs[2*v])*len(self.occurs[2*v+1]))
+            progress = False
+            for var in candidates:
+                if self.unsat or time() > deadline:
+                    break
+                if self.eliminate(var):
+                    done.add(var)
+                    progress = True
+                    self.propagate_units()
+                    self.subsumption(deadline)
+            if not progress:
+                break
+        return self.formula()
+
+    def formula(self):
+        arena = ClauseArena(self.num_of_vars)
+        if self.unsat:
+            arena.add_clause([])
+            return arena
+        for c in self.clauses:
+            if c is not None:
+                arena.add_clause(c)
+        return arena
+
+    def extend_model(self, solution):
+        # solution of the simplified formula => solution of the original one, for every variable
+        values = [False]*(self.num_of_vars+1)
+        for var, val in solution:
+            values[var] = val
+        for var, val in self.fixed.items():
+            values[var] = val
+        for pivot, clause in reversed(self.eliminated):
+            if not any(values[l >> 1] != (l & 1) for l in clause):
+                values[pivot >> 1] = not pivot & 1
+        return [(var, values[var]) for var in range(1, self.num_of_vars+1)]
+
+    def report(self):
+        ret = []
+        for technique, removed in self.stats.items():
+            ret.append(f"{technique}: {removed['clauses']} clauses, {removed['literals']} literals, "
+                       f"{removed['variables']} variables removed")
+        return "\n".join(ret)
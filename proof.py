@@ -0,0 +1,411 @@
+import argparse
+from array import array
+from cnf import ClauseArena, to_literal, to_number
+from dimacs import read_dimacs
+
+
+class ProofWriter:
+    # DRAT proof of the clauses added and deleted by the solver, written through a buffer so that a file
+    # or a pipe gets large blocks. The text format has a line "l1 l2 ... 0" for every added clause and
+    # "d l1 l2 ... 0" for every deleted one, the binary format the byte a or d and the literals as
+    # variable-length integers ending with 0. The literal encoding of the binary format (2*v for v and
+    # 2*v+1 for its negation) is the one of cnf.py, so the literals are written as they are.
+    def __init__(self, path: str, binary: bool = True, buffer_size: int = 1 << 16):
+        self.file = open(path, "wb")
+        self.binary = binary
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.codes = []  # encoding of every literal, extended when bigger literals come
+        self.add_prefix, self.delete_prefix, self.end = (b"a", b"d", b"\0") if binary else (b"", b"d ", b"0\n")
+        self.added = 0
+        self.deleted = 0
+
+    def encode(self, literal: int):
+        if not self.binary:
+            return f"{to_number(literal)} ".encode()
+        ret = bytearray()
+        while literal > 127:
+            ret.append(literal & 127 | 128)
+            literal >>= 7
+        ret.append(literal)
+        return bytes(ret)
+
+    def write(self, prefix: bytes, literals):
+        codes = self.codes
+        if len(literals) > 0 and max(literals) >= len(codes):
+            codes.extend(self.encode(l) for l in range(len(codes), 2*max(literals) + 2))
+        buffer = self.buffer
+        buffer += prefix
+        buffer += b"".join([codes[l] for l in literals])
+        buffer += self.end
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    def add(self, literals):
+        self.write(self.add_prefix, literals)
+        self.added += 1
+
+    def delete(self, literals):
+        self.write(self.delete_prefix, literals)
+        self.deleted += 1
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_proof(path: str):
+    # yields (deleted, literals) for every line of a DRAT proof in the text or the binary format;
+    # a text proof never contains the byte 0, a binary one ends every clause with it
+    with open(path, "rb") as file:
+        data = file.read()
+    if b"\0" in data:
+        i = 0
+        while i < len(data):
+            kind = data[i]
+            if kind not in b"ad":
+                raise ValueError(f"{path}: unexpected byte {kind} at {i} of a binary proof")
+            i += 1
+            literals = []
+            while True:
+                literal, shift = 0, 0
+                while True:
+                    byte = data[i]
+                    i += 1
+                    literal |= (byte & 127) << shift
+                    shift += 7
+                    if byte < 128:
+                        break
+                if literal == 0:
+                    break
+                literals.append(literal)
+            yield kind == ord("d"), literals
+    else:
+        deleted, literals = False, []
+        for line in data.splitlines():
+            if line.startswith(b"c"):
+                continue
+            for token in line.split():
+                if token == b"d":
+                    deleted = True
+                elif token == b"0":
+                    yield deleted, literals
+                    deleted, literals = False, []
+                else:
+                    literals.append(to_literal(int(token)))
+
+
+class Checker:
+    # Forward DRAT checker. Every added clause has to be RUP (propagating the negations of its literals
+    # leads to a conflict) or RAT on its first literal, with respect to the clauses added and not deleted
+    # before it. Clauses are identified by their number in the order of addition (the clauses of the
+    # formula are 1 to m), propagation uses two watched literals and the assignments implied on the top
+    # level are kept between the checks. With lrat, the clauses used by the propagation are collected as
+    # the hints of the LRAT format, in the order in which they become unit.
+    def __init__(self, arena: ClauseArena, lrat: bool = False):
+        self.lrat = lrat
+        self.clauses = dict()  # {id: literals}, the first two literals are watched
+        self.ids = dict()  # {sorted literals: ids of the clauses with them}, for deletions by literals
+        self.values = array('b')
+        self.reason = array('i')  # clause that implied the variable, 0 for the negated lemma
+        self.watches = []
+        self.trail = []
+        self.head = 0  # trail[:head] is propagated
+        self.conflict = None  # clause falsified on the top level
+        self.next_id = 1
+        self.ignored = 0  # deletions of clauses that do not exist
+        for c in arena:
+            self.add(c)
+
+    def grow(self, literals):
+        # make room for the variables of the literals
+        size = 2*((max(literals, default=0) >> 1) + 1)
+        if size > len(self.values):
+            self.reason.extend([0]*((size - len(self.values)) // 2))
+            self.watches.extend([] for _ in range(size - len(self.values)))
+            self.values.extend([0]*(size - len(self.values)))
+
+    def assign(self, literal: int, reason: int):
+        self.values[literal] = 1
+        self.values[literal ^ 1] = -1
+        self.reason[literal >> 1] = reason
+        self.trail.append(literal)
+
+    def backtrack(self, position: int):
+        for l in self.trail[position:]:
+            self.values[l] = 0
+            self.values[l ^ 1] = 0
+        del self.trail[position:]
+        self.head = position
+
+    def propagate(self):
+        # returns the falsified clause or None
+        values, clauses, watches, trail = self.values, self.clauses, self.watches, self.trail
+        while self.head < len(trail):
+            false_lit = trail[self.head] ^ 1
+            self.head += 1
+            watchers = watches[false_lit]
+            kept = []
+            watches[false_lit] = kept
+            for i, c in enumerate(watchers):
+                lits = clauses.get(c)
+                if lits is None:
+                    continue  # deleted
+                if lits[0] == false_lit:
+                    lits[0], lits[1] = lits[1], false_lit
+                if values[lits[0]] == 1:
+                    kept.append(c)
+                    continue
+                for k in range(2, len(lits)):
+                    if values[lits[k]] != -1:
+                        lits[1], lits[k] = lits[k], false_lit
+                        watches[lits[1]].append(c)
+                        break
+                else:
+                    kept.append(c)
+                    if values[lits[0]] == 0:
+                        self.assign(lits[0], c)
+                    else:
+                        kept.extend(watchers[i+1:])
+                        return c
+        return None
+
+    def add(self, literals):
+        # adds a clause without checking it, returns its id
+        lits = list(dict.fromkeys(literals))
+        c = self.next_id
+        self.next_id += 1
+        self.clauses[c] = lits
+        self.ids.setdefault(tuple(sorted(lits)), []).append(c)
+        self.grow(lits)
+        # watch literals that are not false on the top level if there are any
+        lits.sort(key=lambda l: self.values[l] == -1)
+        if len(lits) > 1:
+            self.watches[lits[0]].append(c)
+            self.watches[lits[1]].append(c)
+        if self.conflict is not None:
+            pass
+        elif len(lits) == 0 or self.values[lits[0]] == -1:
+            self.conflict = c
+        elif self.values[lits[0]] == 0 and (len(lits) == 1 or self.values[lits[1]] == -1):
+            self.assign(lits[0], c)
+            self.conflict = self.propagate()
+        return c
+
+    def delete(self, literals):
+        # deletes a clause with the literals, returns its id or None if there is none
+        ids = self.ids.get(tuple(sorted(set(literals))))
+        if not ids:
+            self.ignored += 1
+            return None
+        c = ids.pop()
+        lits = self.clauses.pop(c)
+        if self.conflict == c or any(self.values[l] == 1 and self.reason[l >> 1] == c for l in lits):
+            self.rebuild()
+        return c
+
+    def rebuild(self):
+        # the top level assignments after deleting one of their reasons
+        self.backtrack(0)
+        self.conflict = None
+        for c, lits in self.clauses.items():
+            if len(lits) == 0:
+                self.conflict = c
+                return
+            if len(lits) == 1:
+                if self.values[lits[0]] == -1:
+                    self.conflict = c
+                    return
+                if self.values[lits[0]] == 0:
+                    self.assign(lits[0], c)
+        self.conflict = self.propagate()
+
+    def hints(self, literals, conflict):
+        # the reasons of the falsified literals, transitively, in the order of the trail, then the conflict
+        if not self.lrat:
+            return []
+        seen = set(l >> 1 for l in literals)
+        ret = []
+        for l in reversed(self.trail):
+            var = l >> 1
+            if var in seen and self.reason[var] != 0:
+                ret.append(self.reason[var])
+                seen.update(x >> 1 for x in self.clauses[self.reason[var]])
+        ret.reverse()
+        if conflict is not None:
+            ret.append(conflict)
+        return ret
+
+    def rup(self, literals):
+        # hints (empty without lrat) if the negation of the clause propagates to a conflict, else None
+        if self.conflict is not None:
+            return self.hints(self.clauses[self.conflict], self.conflict)
+        position = len(self.trail)
+        ret = None
+        for l in literals:
+            if self.values[l] == 1:
+                # true on the top level, its reason is falsified by the negation
+                ret = self.hints([l], None)
+                break
+            if self.values[l] == 0:
+                self.assign(l ^ 1, 0)
+        else:
+            conflict = self.propagate()
+            if conflict is not None:
+                ret = self.hints(self.clauses[conflict], conflict)
+        self.backtrack(position)
+        return ret
+
+    def rat(self, literals):
+        # hints (-id of every clause with the negated pivot followed by the hints of the resolvent) if
+        # every resolvent on the first literal is RUP, else None
+        pivot = literals[0]
+        ret = []
+        for c, lits in list(self.clauses.items()):
+            if pivot ^ 1 not in lits:
+                continue
+            resolvent = list(literals) + [l for l in lits if l != pivot ^ 1]
+            ret.append(-c)
+            if any(l ^ 1 in resolvent for l in resolvent):
+                continue  # tautology
+            hints = self.rup(resolvent)
+            if hints is None:
+                return None
+            ret.extend(hints)
+        return ret
+
+    def check(self, literals):
+        # hints of the clause if it is RUP or RAT, else None
+        self.grow(literals)
+        hints = self.rup(literals)
+        if hints is None and len(literals) > 0:
+            hints = self.rat(literals)
+        return hints
+
+
+def check_proof(arena: ClauseArena, path: str, lrat_path: str = None):
+    # checks the DRAT proof of the unsatisfiability of the formula, returns (verified, message);
+    # with lrat_path the proof is written in LRAT with clause ids and hints
+    checker = Checker(arena, lrat=lrat_path is not None)
+    out = None if lrat_path is None else open(lrat_path, "w")
+    try:
+        for i, (deleted, literals) in enumerate(read_proof(path)):
+            if deleted:
+                c = checker.delete(literals)
+                if out is not None and c is not None:
+                    out.write(f"{checker.next_id - 1} d {c} 0\n")
+                continue
+            hints = checker.check(literals)
+            if hints is None:
+                return False, f"line {i+1} of the proof is neither RUP nor RAT: " + \
+                    " ".join(str(to_number(l)) for l in literals)
+            c = checker.add(literals)
+            if out is not None:
+                out.write(" ".join([str(c)] + [str(to_number(l)) for l in literals] + ["0"] +
+                                   [str(h) for h in hints] + ["0"]) + "\n")
+            if len(literals) == 0:
+                return True, f"VERIFIED ({c - 1 - len(arena)} clauses added" + \
+                    (f", {checker.ignored} deletions of missing clauses ignored)" if checker.ignored > 0 else ")")
+        return False, "the proof does not derive the empty clause"
+    finally:
+        if out is not None:
+            out.close()
+
+
+def check_lrat(arena: ClauseArena, path: str):
+    # checks an LRAT proof (lines "id literals 0 hints 0" and "id d ids 0"), returns (verified, message)
+    clauses = {i+1: list(c) for i, c in enumerate(arena)}
+    with open(path, "r") as file:
+        for n, line in enumerate(file):
+            tokens = line.split()
+            if len(tokens) == 0 or tokens[0] == "c":
+                continue
+            if tokens[1] == "d":
+                for c in tokens[2:-1]:
+                    clauses.pop(int(c), None)
+                continue
+            numbers = [int(t) for t in tokens[1:]]
+            end = numbers.index(0)
+            literals = [to_literal(x) for x in numbers[:end]]
+            hints = numbers[end+1:-1]
+            if not lrat_implied(clauses, literals, hints):
+                return False, f"line {n+1}: clause {tokens[0]} does not follow from its hints"
+            clauses[int(tokens[0])] = literals
+            if len(literals) == 0:
+                return True, "VERIFIED"
+    return False, "the proof does not derive the empty clause"
+
+
+def lrat_implied(clauses: dict, literals: list, hints: list):
+    # whether the hints propagate the negation of the clause to a conflict (RUP), or to a conflict
+    # with every clause that contains the negated first literal (RAT, each after its -id hint)
+    true = set(l ^ 1 for l in literals)
+
+    def propagate(true: set, hints: list):
+        for h in hints:
+            if h not in clauses:
+                return False  # deleted or never added
+            unassigned = set()  # a literal may be repeated in the clause
+            for l in clauses[h]:
+                if l in true:
+                    return False  # a satisfied hint is not allowed
+                if l ^ 1 not in true:
+                    unassigned.add(l)
+            if len(unassigned) == 0:
+                return True
+            if len(unassigned) > 1:
+                return False
+            true.add(unassigned.pop())
+        return None
+
+    groups = [[]]
+    for h in hints:
+        if h < 0:
+            groups.append([h])
+        else:
+            groups[-1].append(h)
+    result = propagate(true, groups[0])
+    if result is not None:
+        return result
+    if len(literals) == 0:
+        return False
+    pivot = literals[0]
+    rat = {-group[0]: group[1:] for group in groups[1:]}
+    for c, lits in clauses.items():
+        if pivot ^ 1 not in lits:
+            continue
+        extended = set(true)
+        resolvent = [l for l in lits if l != pivot ^ 1]
+        if any(l in extended for l in resolvent):
+            continue  # the resolvent is a tautology
+        if c not in rat:
+            return False
+        extended.update(l ^ 1 for l in resolvent)
+        if propagate(extended, rat[c]) is not True:
+            return False
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="check proofs of unsatisfiability")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    drat_parser = subparsers.add_parser("drat", help="check a DRAT proof (text or binary)")
+    drat_parser.add_argument("input", help="formula in DIMACS format")
+    drat_parser.add_argument("proof", help="DRAT proof")
+    drat_parser.add_argument("--lrat", metavar="FILE", help="write the checked proof in LRAT")
+    lrat_parser = subparsers.add_parser("lrat", help="check an LRAT proof")
+    lrat_parser.add_argument("input", help="formula in DIMACS format")
+    lrat_parser.add_argument("proof", help="LRAT proof")
+    args = parser.parse_args()
+    arena = read_dimacs(args.input)
+    if args.command == "drat":
+        verified, message = check_proof(arena, args.proof, args.lrat)
+    else:
+        verified, message = check_lrat(arena, args.proof)
+    print(message)
+    if not verified:
+        raise SystemExit(1)
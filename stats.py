@@ -0,0 +1,95 @@
+import cProfile
+import json
+import sys
+from time import perf_counter
+
+
+class Stats:
+    # Counters and time per phase of a search. Methods named in instrument() are replaced on the
+    # solver object by wrappers that count their calls and time, the solvers count the rest with count().
+    # With progress_interval a progress line is printed to stderr at most that often (in seconds).
+    def __init__(self, progress_interval: float = None):
+        self.counters = dict()
+        self.phases = dict()  # {phase: [calls, seconds]}
+        self.lbd = dict()  # {LBD: number of learned clauses}
+        self.sizes = dict()  # {size: number of learned clauses}
+        self.start = perf_counter()
+        self.progress_interval = progress_interval
+        self.next_progress = self.start + (progress_interval or 0)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def learned(self, size: int, lbd: int):
+        self.sizes[size] = self.sizes.get(size, 0) + 1
+        self.lbd[lbd] = self.lbd.get(lbd, 0) + 1
+
+    def timed(self, function, phase: str):
+        # calls and seconds of the phase, exceptions are not timed
+        record = self.phases[phase] = [0, 0.0]
+
+        def wrapper(*args):
+            start = perf_counter()
+            ret = function(*args)
+            record[1] += perf_counter() - start
+            record[0] += 1
+            return ret
+        return wrapper
+
+    def instrument(self, obj, phases: list):
+        for phase in phases:
+            setattr(obj, phase, self.timed(getattr(obj, phase), phase))
+
+    def progress(self, counters):
+        # prints the counters together with the ones returned by the function if the interval has passed
+        if self.progress_interval is None:
+            return
+        now = perf_counter()
+        if now < self.next_progress:
+            return
+        self.next_progress = now + self.progress_interval
+        fields = {**self.counters, **counters()}
+        print(f"c {now - self.start:8.1f} s " + " ".join(f"{name} {value}" for name, value in fields.items()),
+              file=sys.stderr, flush=True)
+
+    def to_dict(self, **values):
+        learned = sum(self.lbd.values())
+        return {
+            "seconds": perf_counter() - self.start,
+            "counters": {**self.counters, **values},
+            "phases": {phase: {"calls": calls, "seconds": seconds} for phase, (calls, seconds) in self.phases.items()},
+            "learned": {
+                "clauses": learned,
+                "average_size": sum(s*n for s, n in self.sizes.items()) / max(learned, 1),
+                "average_lbd": sum(l*n for l, n in self.lbd.items()) / max(learned, 1),
+                "sizes": dict(sorted(self.sizes.items())),
+                "lbd": dict(sorted(self.lbd.items())),
+            },
+        }
+
+    def dump(self, path: str, **values):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(**values), file, indent=1)
+
+
+class SearchHook:
+    # called by the solvers right before and after the search (not while reading or preprocessing)
+    def on_search_start(self, solver):
+        pass
+
+    def on_search_end(self, solver):
+        pass
+
+
+class ProfileHook(SearchHook):
+    # cProfile of the search phase only, written to path in the pstats format
+    def __init__(self, path: str):
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def on_search_start(self, solver):
+        self.profile.enable()
+
+    def on_search_end(self, solver):
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
@@ -0,0 +1,94 @@
+import argparse
+import numpy as np
+from cnf import ClauseArena, to_number
+from dimacs import read_dimacs
+
+
+def true_literals(solution, num_of_vars: int):
+    # boolean vector over the literals (see cnf.py), True for the literals made true by the solution
+    # given as (variable, value) pairs; raises ValueError if a variable has both values
+    pairs = np.array(solution, dtype=np.int64).reshape(-1, 2)
+    literals = 2*pairs[:, 0] + (pairs[:, 1] == 0)
+    size = 2*(max(num_of_vars, int(pairs[:, 0].max(initial=0))) + 1)
+    ret = np.zeros(size, dtype=bool)
+    ret[literals] = True
+    both = np.flatnonzero(ret[0::2] & ret[1::2])
+    if len(both) > 0:
+        raise ValueError(f"variable {both[0]} is both true and false in the solution")
+    return ret
+
+
+def satisfied_clauses(arena: ClauseArena, truth: np.ndarray):
+    # which clauses have a true literal, for one truth vector or for a matrix of them (one per row);
+    # the true literals are counted with a cumulative sum, so a clause is satisfied if the count
+    # grows between its start and end
+    lits = np.frombuffer(arena.lits, dtype=np.int32)
+    starts = np.frombuffer(arena.starts, dtype=np.int32)
+    ends = starts + np.frombuffer(arena.sizes, dtype=np.int32)
+    counts = np.zeros(truth.shape[:-1] + (len(lits)+1,), dtype=np.int32)
+    np.cumsum(truth[..., lits], axis=-1, out=counts[..., 1:])
+    return counts[..., ends] > counts[..., starts]
+
+
+def verify(arena: ClauseArena, solution):
+    # checks the solution without changing anything, returns (ok, index of the first falsified clause
+    # or None, variables of the formula without a value); a partial solution is ok if it satisfies every clause
+    truth = true_literals(solution, arena.num_of_vars)
+    satisfied = satisfied_clauses(arena, truth)
+    falsified = np.flatnonzero(~satisfied)
+    first = int(falsified[0]) if len(falsified) > 0 else None
+    assigned = truth[0::2] | truth[1::2]
+    unassigned = [int(v) for v in np.flatnonzero(~assigned[1:arena.num_of_vars+1]) + 1]
+    return first is None, first, unassigned
+
+
+def verify_batch(arena: ClauseArena, solutions: list):
+    # checks many solutions of the same formula at once, returns the index of the first falsified clause
+    # of every solution (None if it is satisfied)
+    if len(solutions) == 0:
+        return []
+    vectors = [true_literals(s, arena.num_of_vars) for s in solutions]
+    size = max(len(v) for v in vectors)
+    truth = np.zeros((len(vectors), size), dtype=bool)
+    for i, v in enumerate(vectors):
+        truth[i, :len(v)] = v
+    satisfied = satisfied_clauses(arena, truth)
+    ret = []
+    for row in satisfied:
+        falsified = np.flatnonzero(~row)
+        ret.append(int(falsified[0]) if len(falsified) > 0 else None)
+    return ret
+
+
+def read_model(path: str):
+    # a solution as written by the solvers, None for 0 (unsatisfiable) or UNKNOWN
+    with open(path, "r") as file:
+        values = file.read().split()
+    if values in (["0"], ["UNKNOWN"]):
+        return None
+    return [(abs(int(x)), int(x) > 0) for x in values]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="check solutions of a formula")
+    parser.add_argument("input", help="input file in DIMACS format")
+    parser.add_argument("models", nargs="+", help="solutions written by the solvers")
+    args = parser.parse_args()
+    arena = read_dimacs(args.input)
+    models = [read_model(path) for path in args.models]
+    results = verify_batch(arena, [m for m in models if m is not None])
+    failed = 0
+    for path, model in zip(args.models, models):
+        if model is None:
+            print(f"{path}: no solution")
+            continue
+        falsified = results.pop(0)
+        if falsified is None:
+            _, _, unassigned = verify(arena, model)
+            print(f"{path}: OK" + (f", {len(unassigned)} variables unassigned" if len(unassigned) > 0 else ""))
+        else:
+            failed += 1
+            print(f"{path}: clause {falsified} is falsified: " +
+                  " ".join(str(to_number(l)) for l in arena[falsified]))
+    if failed > 0:
+        raise SystemExit(1)